@@ -0,0 +1,146 @@
+"""
+Measures the cold start of a scorer process: a fresh interpreter imports the model code, builds the classifier
+and scores one document, either from a pretrained model directory plus a pickled train.py checkpoint or from
+a safetensors bundle (KbAlbertClassificationModel.from_bundle). Every measurement runs in its own process;
+the files stay in the page cache between runs, so disk reads are not part of the numbers.
+
+python -m benchmarks.cold_start --result_path [RESULT_PATH] --model_size base
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from absl import app, flags, logging
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('result_path', default=None,
+                    help='Path to write the cold start report JSON')
+flags.DEFINE_enum('model_size', default='base', enum_values=['tiny', 'base'],
+                  help='tiny: the benchmark ALBERT, base: the KB-ALBERT (ALBERT base) dimensions')
+flags.DEFINE_integer('repeats', default=5,
+                     help='Number of processes started per loading path, the median is reported')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_enum('load', default=None, enum_values=['checkpoint', 'bundle'],
+                  help='Internal: loads the model this way in the current process and writes the timings')
+flags.DEFINE_string('work_dir', default=None,
+                    help='Internal: directory of the files to load')
+
+BASE_CONFIG = {'embedding_size': 128,
+               'hidden_size': 768,
+               'num_hidden_layers': 12,
+               'num_hidden_groups': 1,
+               'num_attention_heads': 12,
+               'intermediate_size': 3072}
+
+
+def prepare(work_dir: str = None) -> None:
+    """Writes the pretrained model directory, the checkpoint and the bundle of the same classifier."""
+    import torch
+    from transformers import AlbertConfig, AlbertModel
+
+    from benchmarks.synthetic import generate_records, tiny_albert_config, write_vocab
+    from models import KbAlbertClassificationModel
+
+    records = generate_records(1)
+    vocab_path = write_vocab([record['text'] for record in records], os.path.join(work_dir, 'vocab.txt'))
+    with open(vocab_path, encoding='utf-8') as f:
+        vocab_size = len(f.read().splitlines())
+    config_dict = tiny_albert_config(vocab_size, FLAGS.max_length)
+    if FLAGS.model_size == 'base':
+        config_dict.update(BASE_CONFIG)
+
+    model_dir = os.path.join(work_dir, 'model')
+    AlbertModel(AlbertConfig(**config_dict)).save_pretrained(model_dir)
+    config_path = os.path.join(work_dir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config_dict, f)
+    with open(os.path.join(work_dir, 'tokenizer_config.json'), 'w') as f:
+        json.dump({'do_lower_case': False}, f)
+    with open(os.path.join(work_dir, 'document.txt'), 'w', encoding='utf-8') as f:
+        f.write(records[0]['text'])
+
+    model = KbAlbertClassificationModel(model_path=model_dir, config_path=config_path, num_classes=3)
+    torch.save({'state_dict': model.state_dict()}, os.path.join(work_dir, 'model.ckpt'))
+    model.export_bundle(os.path.join(work_dir, 'model.safetensors'), {'do_lower_case': False}, vocab_path)
+
+
+def load_and_score() -> None:
+    """Runs in the child process, times import, load and the first scored document."""
+    start = time.perf_counter()
+    import torch
+    from models import KbAlbertClassificationModel
+    from preprocess import KbAlbertCharTokenizer
+    from models.model_bundle import ModelBundle
+    imported = time.perf_counter()
+
+    work_dir = FLAGS.work_dir
+    if FLAGS.load == 'checkpoint':
+        with open(os.path.join(work_dir, 'tokenizer_config.json'), encoding='UTF-8') as f:
+            tokenizer_config = json.load(f)
+        tokenizer = KbAlbertCharTokenizer(vocab_file=os.path.join(work_dir, 'vocab.txt'),
+                                          pretrained_init_configuration=tokenizer_config)
+        model = KbAlbertClassificationModel(model_path=os.path.join(work_dir, 'model'),
+                                            config_path=os.path.join(work_dir, 'config.json'),
+                                            num_classes=3)
+        model.load_state_dict(torch.load(os.path.join(work_dir, 'model.ckpt'), map_location='cpu')['state_dict'])
+        model.eval()
+    else:
+        bundle_path = os.path.join(work_dir, 'model.safetensors')
+        tokenizer = ModelBundle(bundle_path).tokenizer()
+        model = KbAlbertClassificationModel.from_bundle(bundle_path)
+    loaded = time.perf_counter()
+
+    with open(os.path.join(work_dir, 'document.txt'), encoding='utf-8') as f:
+        text = f.read()
+    encoded = tokenizer(text, max_length=FLAGS.max_length, truncation=True, padding='max_length',
+                        return_attention_mask=True, return_tensors='pt')
+    with torch.no_grad():
+        model({'input_ids': encoded['input_ids'], 'attention_mask': encoded['attention_mask']})
+    scored = time.perf_counter()
+
+    with open(FLAGS.result_path, 'w') as f:
+        json.dump({'import_seconds': imported - start,
+                   'load_seconds': loaded - imported,
+                   'first_score_seconds': scored - loaded,
+                   'total_seconds': scored - start}, f)
+
+
+def main(argv):
+    if FLAGS.load:
+        load_and_score()
+        return
+
+    report = {'model_size': FLAGS.model_size, 'repeats': FLAGS.repeats, 'results': {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare(work_dir)
+        report['bundle_bytes'] = os.path.getsize(os.path.join(work_dir, 'model.safetensors'))
+        for load in ['checkpoint', 'bundle']:
+            runs = []
+            for _ in range(FLAGS.repeats):
+                timing_path = os.path.join(work_dir, 'timing.json')
+                subprocess.run([sys.executable, '-m', 'benchmarks.cold_start', '--load', load,
+                                '--work_dir', work_dir, '--result_path', timing_path,
+                                '--max_length', str(FLAGS.max_length)],
+                               check=True, env=dict(os.environ, PYTHONWARNINGS='ignore'))
+                with open(timing_path) as f:
+                    runs.append(json.load(f))
+            result = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+            report['results'][load] = result
+            logging.info(f'{load:>10}: import {result["import_seconds"]:.3f}s, load {result["load_seconds"]:.3f}s, '
+                         f'first score {result["first_score_seconds"]:.3f}s, total {result["total_seconds"]:.3f}s')
+
+    speedup = report['results']['checkpoint']['load_seconds'] / report['results']['bundle']['load_seconds']
+    logging.info(f'Bundle loads {speedup:.1f}x faster than the pretrained model and checkpoint')
+    with open(FLAGS.result_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['result_path'])
+    app.run(main)
@@ -0,0 +1,79 @@
+"""
+Compares two benchmark results and fails on stages which got slower than the allowed threshold.
+"""
+import json
+import sys
+from typing import Dict, List, Optional
+
+from absl import app, flags, logging
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('baseline_path', default=None,
+                    help='Path of the benchmark result to compare against')
+flags.DEFINE_string('candidate_path', default=None,
+                    help='Path of the new benchmark result')
+flags.DEFINE_float('threshold', default=0.1,
+                   help='Allowed relative slowdown of a stage, 0.1 allows 10% more time')
+flags.DEFINE_list('stage_thresholds', default=[],
+                  help='Per stage thresholds overriding --threshold, e.g. train_step=0.2,inference=0.05')
+
+
+def parse_stage_thresholds(values: List[str] = None) -> Dict[str, float]:
+    thresholds = {}
+    for value in values:
+        stage, threshold = value.split('=')
+        thresholds[stage.strip()] = float(threshold)
+    return thresholds
+
+
+def compare(baseline: Dict = None,
+            candidate: Dict = None,
+            threshold: float = 0.1,
+            stage_thresholds: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Returns one row per stage measured in both results with the relative change of the median time,
+    ``regression`` is set when the change exceeds the threshold of the stage.
+    """
+    stage_thresholds = stage_thresholds or {}
+    rows = []
+    for scale, stages in candidate['results'].items():
+        for stage, result in stages.items():
+            if stage not in baseline['results'].get(scale, {}):
+                continue
+            baseline_seconds = baseline['results'][scale][stage]['seconds']
+            change = result['seconds'] / baseline_seconds - 1. if baseline_seconds > 0 else 0.
+            stage_threshold = stage_thresholds.get(stage, threshold)
+            rows.append({'scale': scale,
+                         'stage': stage,
+                         'baseline_seconds': baseline_seconds,
+                         'candidate_seconds': result['seconds'],
+                         'change': change,
+                         'threshold': stage_threshold,
+                         'regression': change > stage_threshold})
+    return rows
+
+
+def report(rows: List[Dict] = None) -> bool:
+    """Logs the comparison and returns whether any stage regressed."""
+    for row in rows:
+        logging.info(f'{row["scale"]:>5} {row["stage"]:<20} {row["baseline_seconds"]:10.4f}s '
+                     f'-> {row["candidate_seconds"]:10.4f}s ({row["change"]:+.1%})'
+                     + (f'  REGRESSION > {row["threshold"]:.0%}' if row['regression'] else ''))
+    return any(row['regression'] for row in rows)
+
+
+def main(argv):
+    with open(FLAGS.baseline_path) as f:
+        baseline = json.load(f)
+    with open(FLAGS.candidate_path) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, FLAGS.threshold, parse_stage_thresholds(FLAGS.stage_thresholds))
+    if report(rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['baseline_path', 'candidate_path'])
+    app.run(main)
@@ -0,0 +1,173 @@
+"""
+Measures CPU data parallel training throughput against the number of processes through the same path as
+train.py --num_processes: Trainer(distributed_backend='ddp_cpu') over gloo with the model's own train data
+loader (sharded ResumableRandomSampler) and on_train_start (intra-op threads per process). The cores are
+split evenly into threads per process. Uses the synthetic corpus and the tiny ALBERT.
+
+python -m benchmarks.ddp_scaling --result_path [RESULT_PATH] --process_counts 1,2,4,8
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Dict
+
+import torch.distributed as dist
+from absl import app, flags, logging
+from pytorch_lightning import Callback, Trainer, seed_everything
+from transformers import AlbertConfig, AlbertModel
+
+from benchmarks.synthetic import generate_records, tiny_albert_config, write_vocab
+from models import KbAlbertClassificationModel
+from preprocess import KbAlbertCharTokenizer
+from preprocess.corpus_store import CorpusStore, add_token_ids
+from preprocess.labeling import annotations_to_table, label_table, ANNOTATION_COLUMNS
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('result_path', default=None,
+                    help='Path to write the scaling report JSON')
+flags.DEFINE_list('process_counts', default=['1', '2', '4'],
+                  help='Numbers of training processes to measure')
+flags.DEFINE_integer('threads_per_process', default=None,
+                     help='Intra-op threads per process, defaults to the CPU cores divided by the processes')
+flags.DEFINE_integer('scale', default=1,
+                     help='Corpus size as a multiple of the real corpus')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('bench_batch_size', default=4,
+                     help='Batch size per process')
+flags.DEFINE_integer('warm_up_steps', default=2,
+                     help='Number of untimed steps before measuring')
+flags.DEFINE_integer('measure_steps', default=10,
+                     help='Number of timed steps')
+flags.DEFINE_integer('master_port', default=29511,
+                     help='Port of the gloo rendezvous')
+
+
+def prepare(work_dir: str = None) -> Dict[str, str]:
+    """Writes the tokenized synthetic corpus, vocabulary and tiny model shared by every process."""
+    records = generate_records(FLAGS.scale)
+    labeled = label_table(annotations_to_table([[record[name] for name in ANNOTATION_COLUMNS]
+                                                for record in records]))
+    vocab_path = write_vocab(labeled.column('text').to_pylist(), os.path.join(work_dir, 'vocab.txt'))
+    tokenizer = KbAlbertCharTokenizer(vocab_file=vocab_path)
+    store = CorpusStore(os.path.join(work_dir, 'train.parquet'))
+    store.write(add_token_ids(labeled, tokenizer, FLAGS.max_length))
+
+    model_dir = os.path.join(work_dir, 'model')
+    config_dict = tiny_albert_config(tokenizer.vocab_size, FLAGS.max_length)
+    AlbertModel(AlbertConfig(**config_dict)).save_pretrained(model_dir)
+    config_path = os.path.join(model_dir, 'benchmark_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config_dict, f)
+    return {'train_path': store.path,
+            'vocab_path': vocab_path,
+            'model_path': model_dir,
+            'config_path': config_path}
+
+
+class ThroughputMeter(Callback):
+    """
+    Times the training steps after ``warm_up_steps`` up to ``warm_up_steps + measure_steps`` (between barriers
+    of all processes) and writes the result of global rank 0 to ``result_path``.
+    """
+    def __init__(self,
+                 warm_up_steps: int = 2,
+                 measure_steps: int = 10,
+                 result_path: str = None) -> None:
+        self.warm_up_steps = warm_up_steps
+        self.measure_steps = measure_steps
+        self.result_path = result_path
+        self._start = None
+        self._num_samples = 0
+
+    @staticmethod
+    def _barrier() -> None:
+        if dist.is_available() and dist.is_initialized():
+            dist.barrier()
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx, dataloader_idx) -> None:
+        if trainer.global_step == self.warm_up_steps:
+            self._barrier()
+            self._start = time.perf_counter()
+
+    def on_train_batch_end(self, trainer, pl_module, batch, batch_idx, dataloader_idx) -> None:
+        if self._start is None:
+            return
+        # every process iterates an equally long shard
+        self._num_samples += len(batch['input_ids']) * trainer.world_size
+        if trainer.global_step + 1 < self.warm_up_steps + self.measure_steps:
+            return
+
+        self._barrier()
+        seconds = time.perf_counter() - self._start
+        if trainer.global_rank == 0:
+            with open(self.result_path, 'w') as f:
+                json.dump({'num_processes': trainer.world_size,
+                           'threads_per_process': pl_module.num_threads,
+                           'seconds': seconds,
+                           'samples': self._num_samples,
+                           'samples_per_second': self._num_samples / seconds}, f)
+
+
+def measure(paths: Dict[str, str] = None,
+            num_processes: int = None,
+            num_threads: int = None,
+            result_path: str = None) -> Dict:
+    seed_everything(42)
+    model = KbAlbertClassificationModel(train_path=paths['train_path'],
+                                        dev_path=paths['train_path'],
+                                        model_path=paths['model_path'],
+                                        config_path=paths['config_path'],
+                                        tokenizer=KbAlbertCharTokenizer(vocab_file=paths['vocab_path']),
+                                        num_classes=3,
+                                        batch_size=FLAGS.bench_batch_size,
+                                        max_length=FLAGS.max_length,
+                                        num_threads=num_threads)
+    meter = ThroughputMeter(FLAGS.warm_up_steps, FLAGS.measure_steps, result_path)
+    trainer = Trainer(num_processes=num_processes,
+                      distributed_backend='ddp_cpu',
+                      replace_sampler_ddp=False,
+                      max_steps=FLAGS.warm_up_steps + FLAGS.measure_steps,
+                      limit_val_batches=0,
+                      num_sanity_val_steps=0,
+                      checkpoint_callback=False,
+                      logger=False,
+                      weights_summary=None,
+                      progress_bar_refresh_rate=0,
+                      callbacks=[meter])
+    trainer.fit(model)
+
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def main(argv):
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    os.environ['MASTER_PORT'] = str(FLAGS.master_port)
+
+    report = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = prepare(work_dir)
+        for num_processes in [int(count) for count in FLAGS.process_counts]:
+            num_threads = FLAGS.threads_per_process or max(1, os.cpu_count() // num_processes)
+            logging.info(f'Training with {num_processes} process(es) x {num_threads} thread(s)')
+            report.append(measure(paths, num_processes, num_threads,
+                                  os.path.join(work_dir, f'result-{num_processes}.json')))
+
+    base = report[0]['samples_per_second']
+    for row in report:
+        row['speedup'] = row['samples_per_second'] / base
+        row['efficiency'] = row['speedup'] / (row['num_processes'] / report[0]['num_processes'])
+        logging.info(f'{row["num_processes"]:>3} process(es) x {row["threads_per_process"]:>3} thread(s): '
+                     f'{row["samples_per_second"]:8.2f} samples/sec, speedup {row["speedup"]:.2f}, '
+                     f'efficiency {row["efficiency"]:.0%}')
+
+    with open(FLAGS.result_path, 'w') as f:
+        json.dump({'cpu_count': os.cpu_count(), 'results': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['result_path'])
+    app.run(main)
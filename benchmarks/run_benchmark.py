@@ -0,0 +1,202 @@
+"""
+Times every stage of the pipeline (preprocess, label, split, tokenize, dataset build, train step, inference)
+on synthetic corpora of 1x/10x/100x the real one with a tiny randomly initialized ALBERT, and writes the
+results as JSON. Given --baseline_path, fails on stages which regressed more than --threshold.
+
+python -m benchmarks.run_benchmark --result_path [RESULT_PATH] --scales 1,10,100
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import torch
+from absl import app, flags, logging
+from transformers import AlbertConfig, AlbertModel
+
+from benchmarks.compare import compare, parse_stage_thresholds, report
+from benchmarks.synthetic import generate_records, tiny_albert_config, write_vocab
+from dataset_readers import KbAlbertDataset
+from models import KbAlbertClassificationModel
+from preprocess import KbAlbertCharTokenizer
+from preprocess.corpus_store import CorpusStore, add_token_ids
+from preprocess.labeling import annotations_to_table, label_table, ANNOTATION_COLUMNS
+from preprocess.preprocess import normalize_text
+from preprocess.split_dataset import split_indices
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('result_path', default=None,
+                    help='Path to write the benchmark result JSON')
+flags.DEFINE_list('scales', default=['1', '10', '100'],
+                  help='Corpus sizes to benchmark as multiples of the real corpus')
+flags.DEFINE_integer('repeats', default=3,
+                     help='Number of timed runs of every stage, the median is reported')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('bench_batch_size', default=4,
+                     help='Batch size of the train step and inference stages')
+flags.DEFINE_integer('train_steps', default=10,
+                     help='Number of optimizer steps timed in the train step stage')
+flags.DEFINE_integer('inference_batches', default=10,
+                     help='Number of batches timed in the inference stage')
+flags.DEFINE_integer('num_threads', default=None,
+                     help='If given, sets the number of torch intra-op threads')
+
+
+def time_stage(fn: Callable = None,
+               repeats: int = 3,
+               num_items: int = None) -> Dict[str, float]:
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    seconds = sorted(seconds)
+    median = seconds[len(seconds) // 2]
+    return {'seconds': median,
+            'min_seconds': seconds[0],
+            'items': num_items,
+            'items_per_second': num_items / median if median > 0 else float('inf')}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def take_batches(dataloader, num_batches: int = None) -> List[Dict]:
+    batches = []
+    for batch in dataloader:
+        if len(batches) == num_batches:
+            break
+        batches.append(batch)
+    return batches
+
+
+def benchmark_scale(scale: int = None,
+                    work_dir: str = None) -> Dict[str, Dict[str, float]]:
+    results = {}
+    records = generate_records(scale)
+    num_docs = len(records)
+    logging.info(f'Benchmarking {num_docs} documents ({scale}x)')
+
+    def preprocess():
+        return [dict(record, text=normalize_text(record['text'])) for record in records]
+    results['preprocess'] = time_stage(preprocess, FLAGS.repeats, num_docs)
+    records = preprocess()
+
+    lines = [[record[name] for name in ANNOTATION_COLUMNS] for record in records]
+    results['label'] = time_stage(lambda: label_table(annotations_to_table(lines)), FLAGS.repeats, num_docs)
+    labeled = label_table(annotations_to_table(lines))
+
+    split_dir = os.path.join(work_dir, f'split_{scale}')
+    os.makedirs(split_dir, exist_ok=True)
+
+    def split():
+        for name, indices in zip(['train', 'dev', 'test'], split_indices(num_docs, shuffle=True)):
+            CorpusStore(os.path.join(split_dir, f'{name}.parquet')).write(labeled.take(sorted(indices)))
+    results['split'] = time_stage(split, FLAGS.repeats, num_docs)
+
+    vocab_path = write_vocab([record['text'] for record in records], os.path.join(work_dir, f'vocab_{scale}.txt'))
+    tokenizer = KbAlbertCharTokenizer(vocab_file=vocab_path)
+    train_store = CorpusStore(os.path.join(split_dir, 'train.parquet'))
+    train_table = train_store.read()
+    results['tokenize'] = time_stage(lambda: add_token_ids(train_table, tokenizer, FLAGS.max_length),
+                                     FLAGS.repeats, train_table.num_rows)
+    for name in ['train', 'dev']:
+        store = CorpusStore(os.path.join(split_dir, f'{name}.parquet'))
+        store.write(add_token_ids(store.read(), tokenizer, FLAGS.max_length))
+    train_jsonl_path = os.path.join(split_dir, 'train.jsonl')
+    with open(train_jsonl_path, 'w') as f:
+        for row in train_table.to_pylist():
+            f.write(json.dumps({'text': row['text'],
+                                'label_major': row['label_major'],
+                                'label_minor': row['label_minor']}, ensure_ascii=False) + '\n')
+
+    results['dataset_build'] = time_stage(lambda: KbAlbertDataset(train_store.path, tokenizer, FLAGS.max_length),
+                                          FLAGS.repeats, train_table.num_rows)
+    results['dataset_build_jsonl'] = time_stage(lambda: KbAlbertDataset(train_jsonl_path, tokenizer, FLAGS.max_length),
+                                                FLAGS.repeats, train_table.num_rows)
+
+    model_dir = os.path.join(work_dir, f'model_{scale}')
+    config_dict = tiny_albert_config(tokenizer.vocab_size, FLAGS.max_length)
+    torch.manual_seed(42)
+    AlbertModel(AlbertConfig(**config_dict)).save_pretrained(model_dir)
+    config_path = os.path.join(model_dir, 'benchmark_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config_dict, f)
+    model = KbAlbertClassificationModel(train_path=train_store.path,
+                                        dev_path=os.path.join(split_dir, 'dev.parquet'),
+                                        test_path=os.path.join(split_dir, 'test.parquet'),
+                                        model_path=model_dir,
+                                        config_path=config_path,
+                                        tokenizer=tokenizer,
+                                        num_classes=3,
+                                        batch_size=FLAGS.bench_batch_size,
+                                        max_length=FLAGS.max_length)
+
+    optimizer = model.configure_optimizers()
+    train_batches = take_batches(model.train_dataloader(), FLAGS.train_steps)
+
+    def train_step():
+        model.train()
+        for batch_idx, batch in enumerate(train_batches):
+            loss = model.training_step(batch, batch_idx)['loss']
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+    results['train_step'] = time_stage(train_step, FLAGS.repeats,
+                                       sum(len(batch['input_ids']) for batch in train_batches))
+
+    dev_batches = take_batches(model.val_dataloader(), FLAGS.inference_batches)
+
+    def inference():
+        model.eval()
+        with torch.no_grad():
+            for batch in dev_batches:
+                model.forward(batch)
+    results['inference'] = time_stage(inference, FLAGS.repeats,
+                                      sum(len(batch['input_ids']) for batch in dev_batches))
+    return results
+
+
+def main(argv):
+    if FLAGS.num_threads:
+        torch.set_num_threads(FLAGS.num_threads)
+
+    result = {'meta': {'commit': git_commit(),
+                       'python': sys.version.split()[0],
+                       'torch': torch.__version__,
+                       'platform': platform.platform(),
+                       'num_threads': torch.get_num_threads(),
+                       'max_length': FLAGS.max_length,
+                       'repeats': FLAGS.repeats},
+              'results': {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in FLAGS.scales:
+            result['results'][f'{scale}x'] = benchmark_scale(int(scale), work_dir)
+
+    with open(FLAGS.result_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    logging.info(f'Wrote the benchmark result to {FLAGS.result_path}')
+
+    if FLAGS.baseline_path:
+        with open(FLAGS.baseline_path) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, result, FLAGS.threshold, parse_stage_thresholds(FLAGS.stage_thresholds))
+        if report(rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['result_path'])
+    app.run(main)
@@ -0,0 +1,113 @@
+"""
+Synthetic corpus of monetary policy decision-like documents for benchmarking.
+"""
+import datetime
+import os
+import random
+from typing import Dict, List
+
+CORPUS_SIZE = 212
+
+DIRECTIONS = ['fall', 'freeze', 'rise']
+# (voting, probability) roughly following the real distribution
+VOTINGS = [('unanimous', 0.69), ('5-1', 0.21), ('4-2', 0.09), ('3-3', 0.01)]
+
+HEADER = '통화정책방향\n{year}. {month}. {day}.\n'
+DECISIONS = {
+    'fall': '금융통화위원회는 다음 통화정책방향 결정시까지 한국은행 기준금리를 현재의 {rate:.2f}%에서 '
+            '{new_rate:.2f}%로 하향 조정하여 통화정책을 운용하기로 하였다.',
+    'freeze': '금융통화위원회는 다음 통화정책방향 결정시까지 한국은행 기준금리를 현 수준({rate:.2f}%)에서 '
+              '유지하여 통화정책을 운용하기로 하였다.',
+    'rise': '금융통화위원회는 다음 통화정책방향 결정시까지 한국은행 기준금리를 현재의 {rate:.2f}%에서 '
+            '{new_rate:.2f}%로 상향 조정하여 통화정책을 운용하기로 하였다.',
+}
+SENTENCES = [
+    '세계경제는 {factor} 등으로 {trend} 움직임을 나타내었다.',
+    '국제금융시장에서는 {factor} 등으로 주요국 주가가 {move}하고 국채금리는 소폭 등락하였다.',
+    '국내경제는 {sector}이(가) {trend} 흐름을 지속하였다.',
+    '고용 상황은 취업자수 증가폭이 {change}되는 등 {trend} 모습을 보였다.',
+    '소비자물가 상승률은 {factor} 등으로 {rate:.1f}% 내외의 수준을 나타내었다.',
+    '근원인플레이션율(식료품 및 에너지 제외 지수)은 {rate:.1f}% 수준을 유지하였다.',
+    '금융시장은 {factor} 등에 힘입어 {trend} 모습을 나타내었다.',
+    '가계대출은 증가규모가 전월에 비해 {change}되었으며 주택가격은 {move}하였다.',
+    '앞으로 국내경제의 성장세는 {sector}의 {trend} 흐름에 영향받을 것으로 예상된다.',
+    '금융통화위원회는 앞으로 성장세 회복을 지원하고 중기적 시계에서 물가상승률이 목표수준에서 '
+    '안정될 수 있도록 하는 한편 금융안정에 유의하여 통화정책을 운용해 나갈 것이다.',
+    '이 과정에서 {factor}와(과) 국내외 금융경제에 미치는 영향을 면밀히 점검할 것이다.',
+]
+SLOTS = {
+    'factor': ['국제유가 하락', '주요국 통화정책 정상화 기대', '교역 여건 개선', '지정학적 리스크 확대',
+               '경제활동 재개', '반도체 경기 회복', '美 달러화 약세', '내수 부진'],
+    'trend': ['완만한 회복', '견조한 성장', '부진한', '개선되는', '안정된', '다소 둔화되는'],
+    'move': ['상승', '하락', '보합세를 유지'],
+    'sector': ['민간소비', '설비투자', '건설투자', '수출', '상품수출'],
+    'change': ['확대', '축소', '유지'],
+}
+
+
+def _sample_voting(rng: random.Random = None) -> str:
+    threshold = rng.random()
+    for voting, probability in VOTINGS:
+        threshold -= probability
+        if threshold <= 0:
+            return voting
+    return VOTINGS[0][0]
+
+
+def generate_records(scale: int = 1,
+                     seed: int = 42) -> List[Dict[str, str]]:
+    """
+    Generates ``scale`` times the number of real decisions as raw (not normalized) annotated records
+    with the keys of the annotation csv: date, text, major_direction, voting, minor_direction.
+    """
+    rng = random.Random(seed)
+    date = datetime.date(2001, 11, 8)
+    rate = 4.0
+    records = []
+    for _ in range(scale * CORPUS_SIZE):
+        major_direction = rng.choices(DIRECTIONS, weights=[0.1, 0.8, 0.1])[0]
+        new_rate = max(0.25, rate + {'fall': -0.25, 'freeze': 0., 'rise': 0.25}[major_direction])
+        voting = _sample_voting(rng)
+        minor_direction = '' if voting == 'unanimous' else \
+            rng.choice([direction for direction in DIRECTIONS if direction != major_direction])
+
+        sentences = [HEADER.format(year=date.year, month=date.month, day=date.day),
+                     DECISIONS[major_direction].format(rate=rate, new_rate=new_rate)]
+        for _ in range(rng.randint(5, 12)):
+            slots = {name: rng.choice(values) for name, values in SLOTS.items()}
+            sentences.append(rng.choice(SENTENCES).format(rate=rng.uniform(0., 3.), **slots))
+
+        records.append({'date': date.strftime('%Y%m%d'),
+                        'text': '\n'.join(sentences),
+                        'major_direction': major_direction,
+                        'voting': voting,
+                        'minor_direction': minor_direction})
+        date += datetime.timedelta(days=rng.randint(28, 35))
+        rate = new_rate
+    return records
+
+
+def write_vocab(texts: List[str] = None,
+                vocab_path: str = None) -> str:
+    """Writes a character vocabulary in the ``KbAlbertCharTokenizer`` format covering the given texts."""
+    chars = sorted({char for text in texts for char in text if not char.isspace()})
+    tokens = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars + ['##' + char for char in chars]
+    os.makedirs(os.path.dirname(os.path.abspath(vocab_path)), exist_ok=True)
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        for token in tokens:
+            f.write(token + '\n')
+    return vocab_path
+
+
+def tiny_albert_config(vocab_size: int = None,
+                       max_length: int = 512) -> Dict:
+    """Randomly initialized ALBERT small enough to run the train and inference stages on CPU."""
+    return {'vocab_size': vocab_size,
+            'embedding_size': 32,
+            'hidden_size': 64,
+            'num_hidden_layers': 2,
+            'num_hidden_groups': 1,
+            'num_attention_heads': 2,
+            'intermediate_size': 128,
+            'max_position_embeddings': max_length,
+            'type_vocab_size': 2}
@@ -0,0 +1,66 @@
+"""
+Embeds the decisions with the pooler output of a trained text_embedding (the --save_dir of train.py)
+and adds them to the embedding index. Decisions whose date is already in the index are skipped,
+so rerunning with the new decisions only embeds those.
+"""
+import json
+
+from absl import app, flags, logging
+from transformers import AlbertModel
+
+from preprocess import KbAlbertCharTokenizer
+from retrieval import EmbeddingIndex, embed_texts, read_decisions
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list('data_paths', default=None,
+                  help='Comma separated paths to the decisions to index (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('index_dir', default=None,
+                    help='Directory of the embedding index, created if missing')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Trained text embedding path')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('batch_size', default=16,
+                     help='Number of decisions embedded at once')
+flags.DEFINE_integer('ivf_lists', default=None,
+                     help='If given, (re)builds an inverted file index with this number of lists')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+    text_embedding = AlbertModel.from_pretrained(FLAGS.model_path)
+
+    index = EmbeddingIndex(FLAGS.index_dir, dim=text_embedding.config.hidden_size)
+    indexed_dates = {key['date'] for key in index.keys}
+    records = []
+    for data_path in FLAGS.data_paths:
+        for record in read_decisions(data_path):
+            if record['date'] not in indexed_dates:
+                indexed_dates.add(record['date'])
+                records.append(record)
+    logging.info(f'Embedding {len(records)} new decisions, {len(index)} already indexed')
+
+    if records:
+        vectors = embed_texts(text_embedding, tokenizer, [record['text'] for record in records],
+                              FLAGS.max_length, FLAGS.batch_size)
+        index.add([{name: value for name, value in record.items() if name != 'text'} for record in records],
+                  vectors)
+
+    if FLAGS.ivf_lists:
+        index.build_ivf(FLAGS.ivf_lists)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required([
+        'data_paths', 'index_dir', 'tokenizer_config_path', 'vocab_path', 'model_path'
+    ])
+    app.run(main)
@@ -0,0 +1,5 @@
+from callbacks.pretrained_checkpoint import PretrainedCheckpoint
+from callbacks.full_state_checkpoint import FullStateCheckpoint
+
+
+__all__ = ['PretrainedCheckpoint', 'FullStateCheckpoint']
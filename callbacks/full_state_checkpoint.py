@@ -0,0 +1,122 @@
+import logging
+import os
+import random
+from typing import Any, Dict
+
+import numpy as np
+import torch
+from pytorch_lightning import Callback
+
+logger = logging.getLogger(__name__)
+
+
+def get_rng_state() -> Dict[str, Any]:
+    rng_state = {'python': random.getstate(),
+                 'numpy': np.random.get_state(),
+                 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        rng_state['cuda'] = torch.cuda.get_rng_state_all()
+    return rng_state
+
+
+def set_rng_state(rng_state: Dict[str, Any] = None) -> None:
+    random.setstate(rng_state['python'])
+    np.random.set_state(rng_state['numpy'])
+    torch.set_rng_state(rng_state['torch'])
+    if 'cuda' in rng_state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng_state['cuda'])
+
+
+def dump_checkpoint(trainer) -> Dict[str, Any]:
+    connector = getattr(trainer, 'checkpoint_connector', None)
+    if connector is not None:
+        return connector.dump_checkpoint()
+    return trainer.dump_checkpoint()
+
+
+class FullStateCheckpoint(Callback):
+    """
+    Saves a checkpoint every ``every_n_steps`` steps to ``path`` from which training continues mid-epoch
+    with the same results as an uninterrupted run. Next to the lightning state (model, optimizer, global
+    step which drives the warm up, callback states) it stores the train sampler position, the python,
+    numpy and torch RNG states and the train dataset fingerprint.
+
+    To resume, pass the same path to ``Trainer(resume_from_checkpoint=...)`` and as ``resume_path``.
+    The model must provide ``train_sampler`` (a ``ResumableRandomSampler``) and ``train_dataset.fingerprint``.
+
+    A checkpoint due on the last batch of an epoch is saved at the end of that epoch instead, after its
+    validation, so a resumed run never skips the validation (and the model checkpoint and early stopping
+    depending on it) of the epoch it was interrupted in.
+    """
+    def __init__(self,
+                 path: str = None,
+                 every_n_steps: int = 50,
+                 resume_path: str = None) -> None:
+        self.path = path
+        self.every_n_steps = every_n_steps
+        self.resume_path = resume_path
+        self._num_batches = 0
+        self._pending_rng_state = None
+        self._save_at_epoch_end = False
+        self._resumed_epoch = False
+
+    def on_pretrain_routine_end(self, trainer, pl_module) -> None:
+        # before lightning sizes the epoch by the train data loader, which has the length of the resumed pass
+        if not self.resume_path:
+            return
+        full_state = torch.load(self.resume_path, map_location='cpu')['full_state']
+        if full_state['fingerprint'] != pl_module.train_dataset.fingerprint:
+            raise ValueError(f'The train dataset changed since {self.resume_path} was saved, '
+                             'the resumed run would not reproduce the original one')
+        pl_module.train_sampler.load_state_dict(full_state['sampler'])
+        # restored right before the next training step, nothing in between may consume random numbers
+        self._pending_rng_state = full_state['rng']
+        self._resumed_epoch = True
+        logger.info(f'Resuming at epoch {full_state["sampler"]["epoch"]}, '
+                    f'sample {full_state["sampler"]["start_index"]}')
+
+    def on_epoch_start(self, trainer, pl_module) -> None:
+        self._num_batches = 0
+
+    def on_batch_start(self, trainer, pl_module) -> None:
+        if self._pending_rng_state is not None:
+            set_rng_state(self._pending_rng_state)
+            self._pending_rng_state = None
+
+    def on_batch_end(self, trainer, pl_module) -> None:
+        self._num_batches += 1
+        if (trainer.global_step + 1) % self.every_n_steps != 0 or trainer.global_rank != 0:
+            return
+
+        sampler_state = pl_module.train_sampler.state_dict(self._num_batches * pl_module.batch_size)
+        if sampler_state['start_index'] == 0:
+            # the last batch of the epoch, its validation runs after this hook
+            self._save_at_epoch_end = True
+            return
+        # dumped before lightning increments the global step
+        self._save(trainer, pl_module, sampler_state, trainer.global_step + 1)
+
+    def on_epoch_end(self, trainer, pl_module) -> None:
+        if self._save_at_epoch_end:
+            self._save_at_epoch_end = False
+            sampler_state = pl_module.train_sampler.state_dict(self._num_batches * pl_module.batch_size)
+            self._save(trainer, pl_module, sampler_state, trainer.global_step)
+
+        if self._resumed_epoch:
+            # lightning sized the resumed epoch by its remaining batches, the next ones have all of them
+            self._resumed_epoch = False
+            trainer.reset_train_dataloader(pl_module)
+
+    def _save(self, trainer, pl_module, sampler_state: Dict[str, int] = None, global_step: int = None) -> None:
+        checkpoint = dump_checkpoint(trainer)
+        checkpoint['global_step'] = global_step
+        # lightning resumes at the start of the stored epoch, the sampler skips what was consumed
+        checkpoint['epoch'] = sampler_state['epoch']
+        checkpoint['full_state'] = {'sampler': sampler_state,
+                                    'rng': get_rng_state(),
+                                    'fingerprint': pl_module.train_dataset.fingerprint}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        torch.save(checkpoint, self.path + '.tmp')
+        os.replace(self.path + '.tmp', self.path)
+        logger.info(f'Saved full state checkpoint at step {checkpoint["global_step"]} to {self.path}')
@@ -0,0 +1,27 @@
+import logging
+import os
+
+from pytorch_lightning import Callback
+
+logger = logging.getLogger(__name__)
+
+
+class PretrainedCheckpoint(Callback):
+    """
+    Calls ``pl_module.save_pretrained`` every ``every_n_steps`` steps into ``save_dir/step-[STEP]``, which writes the
+    tokenizer files too so every step directory works as ``--model_path`` on its own.
+    """
+    def __init__(self,
+                 save_dir: str = None,
+                 every_n_steps: int = 1000) -> None:
+        self.save_dir = save_dir
+        self.every_n_steps = every_n_steps
+
+    def on_batch_end(self, trainer, pl_module) -> None:
+        step = trainer.global_step + 1
+        if step % self.every_n_steps != 0 or trainer.global_rank != 0:
+            return
+        checkpoint_dir = os.path.join(self.save_dir, f'step-{step}')
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        logger.info(f'Saving pretrained model to {checkpoint_dir}')
+        pl_module.save_pretrained(checkpoint_dir)
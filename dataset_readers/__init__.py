@@ -1,7 +1,8 @@
 import os, sys
 
 from dataset_readers.kbalbert_dataset_reader import KbAlbertDataset
+from dataset_readers.samplers import ResumableRandomSampler
 
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
-__all__ = ['KbAlbertDataset']
\ No newline at end of file
+__all__ = ['KbAlbertDataset', 'ResumableRandomSampler']
\ No newline at end of file
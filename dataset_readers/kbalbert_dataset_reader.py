@@ -1,22 +1,64 @@
+import hashlib
 import json
 import logging
+import os
 from tqdm import tqdm
 
 import torch
 from torch.utils.data import Dataset
 from transformers import AlbertTokenizer
 
+from preprocess.corpus_store import CorpusStore, add_token_ids, is_corpus_path
+
 logger = logging.getLogger(__name__)
 
 
+def dataset_fingerprint(file_path: str = None,
+                        tokenizer: AlbertTokenizer = None,
+                        max_length: int = 512,
+                        start_date: str = None,
+                        end_date: str = None) -> str:
+    """Hash of everything the processed dataset depends on: file content, vocabulary and reader arguments."""
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    sha.update(json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False).encode('utf-8'))
+    sha.update(json.dumps([max_length, start_date, end_date]).encode('utf-8'))
+    return sha.hexdigest()
+
+
 class KbAlbertDataset(Dataset):
     def __init__(self,
                  file_path: str = None,
                  tokenizer: AlbertTokenizer = None,
-                 max_length: int = 512) -> None:
+                 max_length: int = 512,
+                 start_date: str = None,
+                 end_date: str = None,
+                 cache_dir: str = None) -> None:
 
         logger.info(f'Reading file at {file_path}')
 
+        self.fingerprint = dataset_fingerprint(file_path, tokenizer, max_length, start_date, end_date)
+        cache_path = os.path.join(cache_dir, f'{self.fingerprint}.pt') if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            logger.info(f'Loading the processed dataset from {cache_path}')
+            self.processed_dataset = torch.load(cache_path)
+            return
+
+        if is_corpus_path(file_path):
+            self._read_corpus_store(CorpusStore(file_path), tokenizer, max_length, start_date, end_date)
+        else:
+            self._read_jsonl(file_path, tokenizer, max_length)
+
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            torch.save(self.processed_dataset, cache_path)
+
+    def _read_jsonl(self,
+                    file_path: str = None,
+                    tokenizer: AlbertTokenizer = None,
+                    max_length: int = 512) -> None:
         with open(file_path) as dataset_file:
             self.dataset = dataset_file.readlines()
 
@@ -40,12 +82,39 @@ class KbAlbertDataset(Dataset):
 
             processed_data['label_major'] = torch.LongTensor([int(data['label_major'])])
             processed_data['label_minor'] = torch.LongTensor([int(data['label_minor'])])
+            if 'num_dissents' in data:
+                processed_data['num_dissents'] = torch.LongTensor([int(data['num_dissents'])])
 
             self.processed_dataset.append(processed_data)
 
+    def _read_corpus_store(self,
+                           store: CorpusStore = None,
+                           tokenizer: AlbertTokenizer = None,
+                           max_length: int = 512,
+                           start_date: str = None,
+                           end_date: str = None) -> None:
+        schema = store.schema
+        label_columns = [name for name in ['label_major', 'label_minor', 'num_dissents'] if name in schema.names]
+        if 'input_ids' in schema.names and schema.field('input_ids').type.list_size == max_length:
+            # token ids were cached by preprocess/tokenize_dataset.py, share the arrow buffers
+            columns = CorpusStore.token_ids_from_table(store.read(columns=['input_ids', 'num_tokens'] + label_columns,
+                                                                  start_date=start_date,
+                                                                  end_date=end_date))
+        else:
+            logger.info('Tokenizing the text column')
+            table = add_token_ids(store.read(columns=['text'] + label_columns,
+                                             start_date=start_date,
+                                             end_date=end_date),
+                                  tokenizer,
+                                  max_length)
+            columns = CorpusStore.token_ids_from_table(table)
+
+        self.processed_dataset = [{name: tensor[idx] for name, tensor in columns.items()}
+                                  for idx in range(len(columns['input_ids']))]
+
     def __len__(self):
         return len(self.processed_dataset)
 
     def __getitem__(self,
                     idx: int = None):
-        return self.processed_dataset[idx]
\ No newline at end of file
+        return self.processed_dataset[idx]
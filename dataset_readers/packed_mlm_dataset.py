@@ -0,0 +1,103 @@
+import json
+import logging
+from typing import Dict, Iterator, List
+
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from transformers import AlbertTokenizer
+
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+
+logger = logging.getLogger(__name__)
+
+
+def iter_documents(file_path: str = None,
+                   batch_size: int = 64) -> Iterator[str]:
+    """Streams the text of every document of a .jsonl file or a .parquet corpus store."""
+    if is_corpus_path(file_path):
+        table = CorpusStore(file_path).read(columns=['text'])
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield from batch.column(0).to_pylist()
+        return
+
+    with open(file_path) as dataset_file:
+        for line in dataset_file:
+            yield json.loads(line)['text']
+
+
+class KbAlbertPackedMlmDataset(IterableDataset):
+    """
+    Streams documents, concatenates their token ids separated by ``[SEP]`` and cuts the stream into
+    ``[CLS] ... [SEP]`` blocks of exactly ``max_length`` tokens, so no position is spent on padding.
+    The trailing tokens which do not fill a whole block are dropped. With several data loader workers
+    every worker packs its own share of the documents.
+    """
+    def __init__(self,
+                 file_paths: List[str] = None,
+                 tokenizer: AlbertTokenizer = None,
+                 max_length: int = 512) -> None:
+        self.file_paths = file_paths
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+
+    def _iter_token_ids(self) -> Iterator[List[int]]:
+        worker_info = get_worker_info()
+        num_workers = worker_info.num_workers if worker_info else 1
+        worker_id = worker_info.id if worker_info else 0
+
+        doc_idx = 0
+        for file_path in self.file_paths:
+            logger.info(f'Reading file at {file_path}')
+            for text in iter_documents(file_path):
+                if doc_idx % num_workers == worker_id:
+                    yield self.tokenizer.encode(text, add_special_tokens=False) + [self.tokenizer.sep_token_id]
+                doc_idx += 1
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        block_size = self.max_length - 2
+        buffer = []
+        for token_ids in self._iter_token_ids():
+            buffer.extend(token_ids)
+            start = 0
+            while len(buffer) - start >= block_size:
+                input_ids = self.tokenizer.build_inputs_with_special_tokens(buffer[start:start + block_size])
+                yield {'input_ids': torch.LongTensor(input_ids),
+                       'attention_mask': torch.ones(self.max_length, dtype=torch.long)}
+                start += block_size
+            buffer = buffer[start:]
+
+
+class MlmCollator:
+    """
+    Stacks packed blocks and masks them for masked language modeling: ``mlm_probability`` of the
+    non special tokens are selected, 80% of them replaced by ``[MASK]``, 10% by a random token and
+    10% kept. ``labels`` is -100 everywhere except at the selected positions.
+    """
+    def __init__(self,
+                 tokenizer: AlbertTokenizer = None,
+                 mlm_probability: float = 0.15) -> None:
+        self.tokenizer = tokenizer
+        self.mlm_probability = mlm_probability
+        self.special_token_ids = torch.LongTensor(tokenizer.all_special_ids)
+
+    def __call__(self,
+                 examples: List[Dict[str, torch.Tensor]] = None) -> Dict[str, torch.Tensor]:
+        input_ids = torch.stack([example['input_ids'] for example in examples])
+        attention_mask = torch.stack([example['attention_mask'] for example in examples])
+        labels = input_ids.clone()
+
+        probability = torch.full(labels.shape, self.mlm_probability)
+        is_special = (input_ids.unsqueeze(-1) == self.special_token_ids).any(dim=-1)
+        probability.masked_fill_(is_special, 0.)
+        selected = torch.bernoulli(probability).bool()
+        labels[~selected] = -100
+
+        replaced = torch.bernoulli(torch.full(labels.shape, 0.8)).bool() & selected
+        input_ids[replaced] = self.tokenizer.mask_token_id
+
+        randomized = torch.bernoulli(torch.full(labels.shape, 0.5)).bool() & selected & ~replaced
+        input_ids[randomized] = torch.randint(self.tokenizer.vocab_size, labels.shape)[randomized]
+
+        return {'input_ids': input_ids,
+                'attention_mask': attention_mask,
+                'labels': labels}
@@ -0,0 +1,79 @@
+import math
+from typing import Dict, Iterator
+
+import torch
+from torch.utils.data import Dataset, Sampler
+
+
+class ResumableRandomSampler(Sampler):
+    """
+    Random sampler whose order only depends on ``seed`` and the epoch, and which can start in the middle
+    of an epoch. ``state_dict(num_consumed)`` records the position after ``num_consumed`` samples of the
+    current epoch; after ``load_state_dict`` the next iteration skips the samples consumed before, and until
+    that iteration is done the length is the number of the remaining samples, so a data loader created for
+    the resumed pass has the length of that pass.
+
+    In distributed training every one of the ``num_replicas`` processes iterates its own ``rank``-th share
+    of the same permutation, padded like ``DistributedSampler`` so that all shares have the same length.
+    """
+    def __init__(self,
+                 data_source: Dataset = None,
+                 seed: int = 42,
+                 num_replicas: int = 1,
+                 rank: int = 0) -> None:
+        self.data_source = data_source
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self.start_index = 0
+        self._iteration_start = 0
+
+    def shard(self,
+              num_replicas: int = 1,
+              rank: int = 0) -> None:
+        self.num_replicas = num_replicas
+        self.rank = rank
+
+    def set_epoch(self,
+                  epoch: int = None) -> None:
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.start_index = 0
+
+    def __iter__(self) -> Iterator[int]:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        indices = torch.randperm(len(self.data_source), generator=generator).tolist()
+        if self.num_replicas > 1:
+            total_size = self._num_samples() * self.num_replicas
+            indices += indices[:total_size - len(indices)]
+            indices = indices[self.rank:total_size:self.num_replicas]
+
+        self._iteration_start = self.start_index
+        yield from indices[self._iteration_start:]
+        # only the first iteration after a resume starts in the middle of the epoch
+        self.start_index = 0
+
+    def _num_samples(self) -> int:
+        return int(math.ceil(len(self.data_source) / self.num_replicas))
+
+    def __len__(self) -> int:
+        return self._num_samples() - self.start_index
+
+    def state_dict(self,
+                   num_consumed: int = 0) -> Dict[str, int]:
+        start_index = self._iteration_start + num_consumed
+        if start_index >= self._num_samples():
+            return {'seed': self.seed,
+                    'epoch': self.epoch + 1,
+                    'start_index': 0}
+        return {'seed': self.seed,
+                'epoch': self.epoch,
+                'start_index': start_index}
+
+    def load_state_dict(self,
+                        state_dict: Dict[str, int] = None) -> None:
+        self.seed = state_dict['seed']
+        self.epoch = state_dict['epoch']
+        self.start_index = state_dict['start_index']
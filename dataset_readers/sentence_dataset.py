@@ -0,0 +1,67 @@
+import json
+import logging
+from typing import Dict, List
+
+import torch
+from torch import Tensor
+from torch.utils.data import Dataset
+
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+
+logger = logging.getLogger(__name__)
+
+LABEL_COLUMNS = ['label_major', 'label_minor']
+
+
+class KbAlbertSentenceDataset(Dataset):
+    """
+    Documents as the sentence vectors of a ``models.sentence_encoder.SentenceEncoder`` with their labels.
+    The vectors are computed once when reading, training the aggregator on top never runs the encoder.
+    """
+    def __init__(self,
+                 file_path: str = None,
+                 sentence_encoder=None,
+                 max_sentences: int = 64) -> None:
+
+        logger.info(f'Reading file at {file_path}')
+
+        if is_corpus_path(file_path):
+            records = CorpusStore(file_path).read(columns=['text'] + LABEL_COLUMNS).to_pylist()
+        else:
+            with open(file_path) as dataset_file:
+                records = [json.loads(line) for line in dataset_file]
+
+        num_encoded, num_reused = sentence_encoder.num_encoded, sentence_encoder.num_reused
+        vectors = sentence_encoder.encode_documents([record['text'] for record in records])
+        logger.info(f'Encoded {sentence_encoder.num_encoded - num_encoded} sentences, '
+                    f'reused {sentence_encoder.num_reused - num_reused} from the cache')
+
+        self.processed_dataset = []
+        for record, sentence_vectors in zip(records, vectors):
+            processed_data = {'sentence_vectors': sentence_vectors[:max_sentences]}
+            for name in LABEL_COLUMNS:
+                processed_data[name] = torch.LongTensor([int(record[name])])
+            self.processed_dataset.append(processed_data)
+
+    def __len__(self):
+        return len(self.processed_dataset)
+
+    def __getitem__(self,
+                    idx: int = None):
+        return self.processed_dataset[idx]
+
+
+def collate_sentences(items: List[Dict[str, Tensor]] = None) -> Dict[str, Tensor]:
+    """Pads the sentence vectors of a batch to ``[batch, max_sentences, hidden]`` with a ``sentence_mask``."""
+    max_sentences = max(len(item['sentence_vectors']) for item in items)
+    hidden_size = items[0]['sentence_vectors'].size(1)
+    batch = {'sentence_vectors': torch.zeros(len(items), max_sentences, hidden_size),
+             'sentence_mask': torch.zeros(len(items), max_sentences, dtype=torch.long)}
+    for idx, item in enumerate(items):
+        num_sentences = len(item['sentence_vectors'])
+        batch['sentence_vectors'][idx, :num_sentences] = item['sentence_vectors']
+        batch['sentence_mask'][idx, :num_sentences] = 1
+    for name in items[0]:
+        if name != 'sentence_vectors':
+            batch[name] = torch.stack([item[name] for item in items])
+    return batch
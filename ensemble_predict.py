@@ -0,0 +1,98 @@
+"""
+Scores decisions with an ensemble of classifier bundles (export_bundle.py / train.py), e.g. several seeds or
+folds of the same model. With --dev_path every member's temperature is fitted on the dev split first.
+Writes the averaged calibrated probabilities with the per-member predictions and their disagreement.
+"""
+import json
+from typing import Dict, List
+
+import torch
+from absl import app, flags, logging
+from torch.nn import functional as F
+from torch.utils.data import DataLoader, SequentialSampler
+
+from dataset_readers import KbAlbertDataset
+from models import KbAlbertClassificationModel, KbAlbertEnsemble
+from models.ensemble import expected_calibration_error
+from models.model_bundle import ModelBundle
+from retrieval import read_decisions
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list('bundle_paths', default=None,
+                  help='Comma separated paths to the member bundles (.safetensors)')
+flags.DEFINE_string('input_path', default=None,
+                    help='Path to the decisions to score (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('output_path', default=None,
+                    help='Path to write the predictions as JSON lines')
+flags.DEFINE_string('dev_path', default=None,
+                    help='If given, calibrates the member temperatures on this labeled dataset')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('batch_size', default=4,
+                     help='Number of decisions scored at once')
+flags.DEFINE_integer('num_workers', default=None,
+                     help='Number of members run concurrently when they do not share an encoder')
+
+
+def collect_logits(ensemble: KbAlbertEnsemble = None,
+                   batches: List[Dict] = None) -> torch.Tensor:
+    return torch.cat([ensemble.member_logits(batch) for batch in batches])
+
+
+def main(argv):
+    tokenizer = ModelBundle(FLAGS.bundle_paths[0]).tokenizer()
+    members = [KbAlbertClassificationModel.from_bundle(path) for path in FLAGS.bundle_paths]
+    ensemble = KbAlbertEnsemble(members, num_workers=FLAGS.num_workers)
+
+    if FLAGS.dev_path:
+        dev_dataset = KbAlbertDataset(FLAGS.dev_path, tokenizer, FLAGS.max_length)
+        dev_batches = list(DataLoader(dev_dataset, sampler=SequentialSampler(dev_dataset),
+                                      batch_size=FLAGS.batch_size))
+        labels = torch.cat([batch['label_major' if ensemble.num_classes == 3 else 'label_minor'].view(-1)
+                            for batch in dev_batches])
+        dev_logits = collect_logits(ensemble, dev_batches)
+
+        before = ensemble.predict(member_logits=dev_logits)
+        ensemble.calibrate(dev_logits, labels)
+        after = ensemble.predict(member_logits=dev_logits)
+        for name, result in [('uncalibrated', before), ('calibrated', after)]:
+            logging.info(f'Dev {name}: acc {float((result["prediction"] == labels).float().mean()):.4f}, '
+                         f'nll {float(F.nll_loss(torch.log(result["probs"] + 1e-12), labels)):.4f}, '
+                         f'ece {expected_calibration_error(result["probs"], labels):.4f}')
+        for idx, path in enumerate(FLAGS.bundle_paths):
+            accuracy = float((after['member_predictions'][:, idx] == labels).float().mean())
+            logging.info(f'Dev member {path}: acc {accuracy:.4f}, temperature {float(ensemble.temperatures[idx]):.3f}')
+
+    records = read_decisions(FLAGS.input_path)
+    disagreements = []
+    with open(FLAGS.output_path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(records), FLAGS.batch_size):
+            batch_records = records[start:start + FLAGS.batch_size]
+            encoded = tokenizer([record['text'] for record in batch_records],
+                                add_special_tokens=True,
+                                max_length=FLAGS.max_length,
+                                truncation=True,
+                                padding='max_length',
+                                return_attention_mask=True,
+                                return_tensors='pt')
+            result = ensemble.predict({'input_ids': encoded['input_ids'],
+                                       'attention_mask': encoded['attention_mask']})
+            disagreements.append(result['member_predictions'] != result['prediction'][:, None])
+            for idx, record in enumerate(batch_records):
+                f.write(json.dumps({'date': record.get('date'),
+                                    'prediction': int(result['prediction'][idx]),
+                                    'probs': result['probs'][idx].tolist(),
+                                    'member_predictions': result['member_predictions'][idx].tolist(),
+                                    'disagreement': float(result['disagreement'][idx])}) + '\n')
+
+    member_disagreement = torch.cat(disagreements).float().mean(dim=0) if disagreements else []
+    for path, rate in zip(FLAGS.bundle_paths, member_disagreement):
+        logging.info(f'{path} disagrees with the ensemble on {float(rate):.1%} of the decisions')
+    logging.info(f'Wrote the predictions of {len(records)} decisions to {FLAGS.output_path}')
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['bundle_paths', 'input_path', 'output_path'])
+    app.run(main)
@@ -0,0 +1,69 @@
+"""
+Converts a train.py checkpoint (or, without --checkpoint_path, a pretrained model directory) into a single
+safetensors bundle with the tokenizer config and vocabulary. A classifier bundle is loaded for scoring with
+KbAlbertClassificationModel.from_bundle, an encoder bundle can be given as --model_path of train.py.
+"""
+import json
+
+import torch
+from absl import app, flags, logging
+from transformers import AlbertConfig, AlbertModel
+
+from models import KbAlbertClassificationModel
+from models.model_bundle import save_bundle
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('bundle_path', default=None,
+                    help='Path of the bundle to write (.safetensors)')
+flags.DEFINE_string('checkpoint_path', default=None,
+                    help='If given, exports this checkpoint saved by train.py (major or minor model)')
+flags.DEFINE_string('label_type', default=None,
+                    help='Label type of the checkpoint (major or minor)')
+flags.DEFINE_string('inference_config_path', default=None,
+                    help='If given, stores these inference options (see sweep_inference.py) in the bundle')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Pretrained model path')
+flags.DEFINE_string('model_config_path', default=None,
+                    help='Pretrained model config path')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+
+    if FLAGS.checkpoint_path is None:
+        with open(FLAGS.model_config_path, encoding='UTF-8') as f:
+            config = AlbertConfig(**json.load(f))
+        text_embedding = AlbertModel.from_pretrained(pretrained_model_name_or_path=FLAGS.model_path, config=config)
+        state_dict = {f'text_embedding.{name}': tensor for name, tensor in text_embedding.state_dict().items()}
+        save_bundle(FLAGS.bundle_path, state_dict, text_embedding.config, tokenizer_config, FLAGS.vocab_path)
+        logging.info(f'Wrote the encoder bundle to {FLAGS.bundle_path}')
+        return
+
+    if FLAGS.label_type == 'major':
+        num_classes = 3
+    elif FLAGS.label_type == 'minor':
+        num_classes = 4
+    else:
+        raise ValueError('Unknown model type')
+
+    model = KbAlbertClassificationModel(model_path=FLAGS.model_path,
+                                        config_path=FLAGS.model_config_path,
+                                        num_classes=num_classes)
+    model.load_state_dict(torch.load(FLAGS.checkpoint_path, map_location='cpu')['state_dict'])
+    if FLAGS.inference_config_path:
+        model.load_inference_config(FLAGS.inference_config_path)
+    model.export_bundle(FLAGS.bundle_path, tokenizer_config, FLAGS.vocab_path)
+    logging.info(f'Wrote the classifier bundle to {FLAGS.bundle_path}')
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['bundle_path', 'tokenizer_config_path', 'vocab_path', 'model_path',
+                                  'model_config_path'])
+    app.run(main)
@@ -1,4 +1,7 @@
 from models.kbalbert_model import KbAlbertClassificationModel
+from models.kbalbert_multitask_model import KbAlbertMultiTaskModel
+from models.kbalbert_sentence_model import KbAlbertSentenceModel
+from models.ensemble import KbAlbertEnsemble
 
 
-__all__ = ['KbAlbertClassificationModel']
\ No newline at end of file
+__all__ = ['KbAlbertClassificationModel', 'KbAlbertMultiTaskModel', 'KbAlbertSentenceModel', 'KbAlbertEnsemble']
@@ -0,0 +1,126 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import torch
+from torch import Tensor
+from torch.nn import functional as F
+
+from models.kbalbert_model import KbAlbertClassificationModel
+from models.sentence_encoder import encoder_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def fit_temperature(logits: Tensor = None,
+                    labels: Tensor = None,
+                    max_iter: int = 50) -> float:
+    """Temperature scaling: the single temperature minimizing the negative log likelihood of ``logits``."""
+    log_temperature = torch.zeros(1, requires_grad=True)
+    optimizer = torch.optim.LBFGS([log_temperature], lr=0.1, max_iter=max_iter)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = F.cross_entropy(logits / log_temperature.exp(), labels)
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    return log_temperature.exp().item()
+
+
+def expected_calibration_error(probs: Tensor = None,
+                               labels: Tensor = None,
+                               num_bins: int = 10) -> float:
+    confidences, preds = probs.max(dim=-1)
+    bins = torch.clamp((confidences * num_bins).long(), max=num_bins - 1)
+    error = 0.
+    for bin_idx in range(num_bins):
+        in_bin = bins == bin_idx
+        if in_bin.any():
+            accuracy = (preds[in_bin] == labels[in_bin]).float().mean()
+            error += in_bin.float().mean() * abs(float(confidences[in_bin].mean()) - float(accuracy))
+    return float(error)
+
+
+class KbAlbertEnsemble:
+    """
+    Averages the temperature scaled probabilities of several ``KbAlbertClassificationModel`` members, e.g.
+    trained with other seeds or folds.
+
+    When every member has the same ``text_embedding`` weights (and inference options, without early exit) the
+    encoder runs once per batch and the classifiers are applied as one stacked matmul. Otherwise the members
+    run concurrently in a thread pool of ``num_workers``, torch releases the GIL inside its kernels.
+    """
+    def __init__(self,
+                 members: List[KbAlbertClassificationModel] = None,
+                 num_workers: int = None) -> None:
+        if len({member.num_classes for member in members}) != 1:
+            raise ValueError('Members of an ensemble must predict the same classes')
+        self.members = members
+        self.num_classes = members[0].num_classes
+        self.num_workers = num_workers or len(members)
+        self.temperatures = torch.ones(len(members))
+        for member in members:
+            member.eval()
+
+        self.shared_encoder = len(members) > 1 and self._share_encoder()
+        if self.shared_encoder:
+            self.weight = torch.stack([member.classifier.weight.detach() for member in members])
+            self.bias = torch.stack([member.classifier.bias.detach() for member in members])
+        logger.info(f'Ensemble of {len(members)} members, '
+                    + ('one shared encoder pass' if self.shared_encoder else f'{self.num_workers} workers'))
+
+    def _share_encoder(self) -> bool:
+        first = self.members[0]
+        if any(member.num_layers != first.num_layers or member.exit_threshold is not None
+               or member.head_mask is not None for member in self.members):
+            return False
+        fingerprint = encoder_fingerprint(first.text_embedding)
+        return all(member.text_embedding is first.text_embedding
+                   or encoder_fingerprint(member.text_embedding) == fingerprint
+                   for member in self.members[1:])
+
+    def member_logits(self,
+                      batch: Dict = None) -> Tensor:
+        """Raw logits of every member as ``[batch, members, classes]``."""
+        if self.shared_encoder:
+            with torch.no_grad():
+                pooled = self.members[0].embed(batch)
+                return torch.einsum('bh,mch->bmc', pooled, self.weight) + self.bias
+
+        def run(member):
+            # no_grad is thread local
+            with torch.no_grad():
+                return member(batch)
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            return torch.stack(list(executor.map(run, self.members)), dim=1)
+
+    def calibrate(self,
+                  member_logits: Tensor = None,
+                  labels: Tensor = None) -> None:
+        """Fits the temperature of every member on held out ``[documents, members, classes]`` logits."""
+        self.temperatures = torch.tensor([fit_temperature(member_logits[:, idx], labels)
+                                          for idx in range(len(self.members))])
+        logger.info(f'Member temperatures: {self.temperatures.tolist()}')
+
+    def predict(self,
+                batch: Dict = None,
+                member_logits: Tensor = None) -> Dict[str, Tensor]:
+        """
+        Returns the averaged calibrated ``probs``, the ``prediction``, every member's ``member_probs`` and
+        ``member_predictions``, and per document the ``disagreement``: the share of the members whose
+        prediction differs from the ensemble one.
+        """
+        if member_logits is None:
+            member_logits = self.member_logits(batch)
+        member_probs = torch.softmax(member_logits / self.temperatures[None, :, None], dim=-1)
+        probs = member_probs.mean(dim=1)
+        prediction = probs.argmax(dim=-1)
+        member_predictions = member_probs.argmax(dim=-1)
+        return {'probs': probs,
+                'prediction': prediction,
+                'member_probs': member_probs,
+                'member_predictions': member_predictions,
+                'disagreement': (member_predictions != prediction[:, None]).float().mean(dim=1)}
@@ -0,0 +1,159 @@
+from typing import Tuple, Dict, Union, List, Optional, Sequence
+import json
+import logging
+import os
+
+import torch
+from torch import nn, Tensor
+from torch.nn import CrossEntropyLoss
+from torch.optim import Optimizer
+from torch.utils.data import DataLoader
+from pytorch_lightning.core.lightning import LightningModule
+from pytorch_lightning import TrainResult
+from transformers import AlbertTokenizer, AlbertConfig, AlbertModel, AdamW, WEIGHTS_NAME
+from transformers.modeling_albert import AlbertMLMHead
+
+from dataset_readers.packed_mlm_dataset import KbAlbertPackedMlmDataset, MlmCollator
+
+logger = logging.getLogger(__name__)
+
+
+class KbAlbertMaskedLmModel(LightningModule):
+    """
+    Continued masked language model pretraining of the ALBERT encoder on the decision texts.
+    ``text_embedding`` is the same ``AlbertModel`` (pooler included) as in ``KbAlbertClassificationModel``,
+    ``predictions`` the masked language model head tied to its word embeddings, loaded from the ``predictions.*``
+    weights of the checkpoint and saved with them by ``save_pretrained`` so pretraining continues from it.
+    """
+    def __init__(self,
+                 train_paths: List[str] = None,
+                 model_path: str = None,
+                 config_path: str = None,
+                 tokenizer: AlbertTokenizer = None,
+                 tokenizer_config: Dict = None,
+                 max_length: int = 512,
+                 mlm_probability: float = 0.15,
+                 batch_size: int = 4,
+                 num_workers: int = 0,
+                 lr: float = 5e-5,
+                 weight_decay: float = 0.01,
+                 warm_up: int = 100):
+        super(KbAlbertMaskedLmModel, self).__init__()
+
+        self.tokenizer = tokenizer
+        self.tokenizer_config = tokenizer_config
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.lr = lr
+        self.weight_decay = weight_decay
+        self.warm_up = warm_up
+
+        self.save_hyperparameters()
+
+        self.train_dataset = KbAlbertPackedMlmDataset(train_paths, tokenizer, max_length)
+        self.collator = MlmCollator(tokenizer, mlm_probability)
+
+        with open(config_path, encoding='UTF-8') as f:
+            config_dict = json.loads(f.read())
+        config = AlbertConfig(**config_dict)
+        self.text_embedding = AlbertModel.from_pretrained(pretrained_model_name_or_path=model_path,
+                                                          config=config)
+        self.predictions = AlbertMLMHead(config)
+        self._load_predictions(model_path)
+        self.predictions.decoder.weight = self.text_embedding.embeddings.word_embeddings.weight
+
+    def _load_predictions(self,
+                          model_path: str = None) -> None:
+        weights_path = os.path.join(model_path, WEIGHTS_NAME)
+        state_dict = torch.load(weights_path, map_location='cpu') if os.path.isfile(weights_path) else {}
+        # the decoder weight is tied to the word embeddings right after
+        head_state_dict = {name[len('predictions.'):]: tensor for name, tensor in state_dict.items()
+                           if name.startswith('predictions.') and name != 'predictions.decoder.weight'}
+        missing = [name for name in self.predictions.state_dict()
+                   if name not in head_state_dict and name != 'decoder.weight']
+        if missing:
+            logger.warning(f'No pretrained masked language model head weights {missing} in {model_path}, '
+                           'they start from random weights')
+        self.predictions.load_state_dict(head_state_dict, strict=False)
+
+    def forward(self,
+                batch: Dict = None) -> Tensor:
+        text_embedded = self.text_embedding(batch['input_ids'],
+                                            token_type_ids=None,
+                                            attention_mask=batch['attention_mask'])
+        prediction_scores = self.predictions(text_embedded[0])
+
+        loss_fct = CrossEntropyLoss()
+        return loss_fct(prediction_scores.view(-1, prediction_scores.size(-1)), batch['labels'].view(-1))
+
+    def train_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
+        train_dataloader = DataLoader(self.train_dataset,
+                                      batch_size=self.batch_size,
+                                      num_workers=self.num_workers,
+                                      collate_fn=self.collator)
+        return train_dataloader
+
+    def configure_optimizers(self) -> Optional[
+        Union[
+            Optimizer, Sequence[Optimizer], Dict, Sequence[Dict], Tuple[List, List]
+        ]
+    ]:
+        no_decay = ['bias', 'LayerNorm.weight']
+        optimizer_grouped_parameters = [
+            {'params': [p for n, p in self.named_parameters() if not any(nd in n for nd in no_decay)],
+             'weight_decay': self.weight_decay},
+            {'params': [p for n, p in self.named_parameters() if any(nd in n for nd in no_decay)], 'weight_decay': 0.0}
+        ]
+        optimizer = AdamW(optimizer_grouped_parameters,
+                          lr=self.lr,
+                          eps=1e-8)
+        return optimizer
+
+    def optimizer_step(self, epoch, batch_idx, optimizer, optimizer_idx, second_order_closure=None,
+                       on_tpu=False, using_native_amp=False, using_lbfgs=False):
+        # warm up lr
+        if self.trainer.global_step < self.warm_up:
+            lr_scale = min(1., float(self.trainer.global_step + 1) / float(self.warm_up))
+        else:
+            lr_scale = min(1., float(self.warm_up) / float(self.trainer.global_step + 1))
+        for pg in optimizer.param_groups:
+            pg['lr'] = lr_scale * self.lr
+
+        # update params
+        optimizer.step()
+        optimizer.zero_grad()
+
+    def training_step(self,
+                      batch: Dict = None,
+                      batch_idx: int = None) -> Dict[str, Tensor]:
+        loss = self.forward(batch)
+
+        nn.utils.clip_grad_norm_(self.parameters(), 1.0)
+
+        return {'loss': loss, 'log': {'train_mlm_loss': loss}}
+
+    def training_epoch_end(
+            self, outputs: Union[TrainResult, List[TrainResult]]
+    ) -> Dict[str, Dict[str, Tensor]]:
+        avg_loss = torch.stack([x['loss'] for x in outputs]).mean()
+
+        logs = {'avg_train_mlm_loss': avg_loss}
+        return {'train_loss': avg_loss, 'log': logs}
+
+    def save_pretrained(self,
+                        save_dir: str = None) -> None:
+        """
+        Saves the encoder (config.json, and weights next to the ``predictions.*`` head weights) with the vocabulary
+        and the tokenizer config, ready for ``train.py --model_path`` or another round of ``pretrain.py``.
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        self.text_embedding.config.save_pretrained(save_dir)
+        state_dict = self.text_embedding.state_dict()
+        # without the decoder weight, which is the word embedding matrix tied again on load
+        state_dict.update({'predictions.' + name: tensor for name, tensor in self.predictions.state_dict().items()
+                           if name != 'decoder.weight'})
+        torch.save(state_dict, os.path.join(save_dir, WEIGHTS_NAME))
+
+        self.tokenizer.save_vocabulary(save_dir)
+        with open(os.path.join(save_dir, 'tokenizer_config.json'), 'w', encoding='UTF-8') as f:
+            json.dump(self.tokenizer_config or {}, f, ensure_ascii=False)
@@ -4,14 +4,16 @@ import json
 import torch
 from torch import nn, Tensor
 from torch.optim import Optimizer
-from torch.utils.data import DataLoader, RandomSampler, DistributedSampler, SequentialSampler
+import torch.distributed as dist
+from torch.utils.data import DataLoader, SequentialSampler
 from torch.nn import CrossEntropyLoss
 from pytorch_lightning.core.lightning import LightningModule
 from pytorch_lightning.metrics.functional import accuracy, precision, recall
 from pytorch_lightning import TrainResult, EvalResult
 from transformers import AlbertTokenizer, AlbertConfig, AlbertModel, AdamW
 
-from dataset_readers import KbAlbertDataset
+from dataset_readers import KbAlbertDataset, ResumableRandomSampler
+from models.model_bundle import ModelBundle, assign_tensors, is_bundle_path, save_bundle, skip_init
 
 
 class KbAlbertClassificationModel(LightningModule):
@@ -28,7 +30,11 @@ class KbAlbertClassificationModel(LightningModule):
                  num_workers: int = 0,
                  lr: float = 2e-5,
                  weight_decay: float = 0.1,
-                 warm_up: int = 20):
+                 warm_up: int = 20,
+                 cache_dir: str = None,
+                 seed: int = 42,
+                 max_length: int = 512,
+                 num_threads: int = None):
         super(KbAlbertClassificationModel, self).__init__()
 
         self.num_classes = num_classes
@@ -38,42 +44,229 @@ class KbAlbertClassificationModel(LightningModule):
         self.lr = lr
         self.weight_decay = weight_decay
         self.warm_up = warm_up
+        self.seed = seed
+        self.num_threads = num_threads
 
         self.save_hyperparameters()
 
-        self.train_dataset = KbAlbertDataset(train_path, tokenizer)
-        self.val_dataset = KbAlbertDataset(dev_path, tokenizer)
-        self.test_dataset = KbAlbertDataset(test_path, tokenizer)
-
-        f = open(config_path, encoding='UTF-8')
-        config_dict = json.loads(f.read())
-        config = AlbertConfig(**config_dict)
-        self.text_embedding = AlbertModel.from_pretrained(pretrained_model_name_or_path=model_path,
-                                                          config=config)
+        # the datasets are optional so the model can be built for scoring only
+        self.train_dataset = KbAlbertDataset(train_path, tokenizer, max_length, cache_dir=cache_dir) \
+            if train_path else None
+        self.val_dataset = KbAlbertDataset(dev_path, tokenizer, max_length, cache_dir=cache_dir) \
+            if dev_path else None
+        self.test_dataset = KbAlbertDataset(test_path, tokenizer, max_length, cache_dir=cache_dir) \
+            if test_path else None
+        self.train_sampler = ResumableRandomSampler(self.train_dataset, seed=seed) if train_path else None
+
+        if is_bundle_path(model_path):
+            # the encoder weights of a bundle are memory mapped instead of unpickled from pytorch_model.bin
+            bundle = ModelBundle(model_path)
+            if config_path:
+                with open(config_path, encoding='UTF-8') as f:
+                    config = AlbertConfig(**json.load(f))
+            else:
+                config = bundle.albert_config()
+            with skip_init():
+                self.text_embedding = AlbertModel(config)
+            assign_tensors(self.text_embedding, bundle.tensors(prefix='text_embedding.'))
+        else:
+            with open(config_path, encoding='UTF-8') as f:
+                config = AlbertConfig(**json.load(f))
+            self.text_embedding = AlbertModel.from_pretrained(pretrained_model_name_or_path=model_path,
+                                                              config=config)
 
         self.classifier_hidden_size = self.text_embedding.config.hidden_size
         self.classifier = nn.Linear(self.classifier_hidden_size, self.num_classes)
 
+        # inference options, see configure_inference
+        self.num_layers = None
+        self.exit_threshold = None
+        self.head_mask = None
+
     def forward(self,
                 batch: Dict = None) -> float:
-        text_embedded = self.text_embedding(batch['input_ids'],
-                                            token_type_ids=None,
-                                            attention_mask=batch['attention_mask'])
+        if self.exit_threshold is not None and not self.training:
+            return self._forward_early_exit(batch)
 
-        logits = self.classifier(text_embedded[1])
+        logits = self.classifier(self.embed(batch))
+
+        return logits
 
+    def embed(self,
+              batch: Dict = None) -> Tensor:
+        """Pooler output of ``text_embedding``, over the first ``num_layers`` repetitions if configured."""
+        if self.num_layers is None and self.head_mask is None:
+            text_embedded = self.text_embedding(batch['input_ids'],
+                                                token_type_ids=None,
+                                                attention_mask=batch['attention_mask'])
+            return text_embedded[1]
+
+        hidden_states, attention_mask = self._embed_input(batch)
+        for layer_idx in range(self.num_layers or self.text_embedding.config.num_hidden_layers):
+            hidden_states = self._apply_layer(layer_idx, hidden_states, attention_mask)
+        return self._pool(hidden_states)
+
+    def configure_inference(self,
+                            num_layers: int = None,
+                            exit_threshold: float = None,
+                            pruned_heads: Dict[int, List[int]] = None) -> None:
+        """
+        Trades accuracy for inference speed. ALBERT shares its weights across the layer repetitions, so the cost
+        is in the repetitions: ``num_layers`` runs only the first K of them, and with ``exit_threshold`` (in eval
+        mode) a document leaves as soon as the classifier on its intermediate [CLS] state is that confident.
+        ``pruned_heads`` ({layer: [heads]}, the layers as in ``AlbertModel.prune_heads``) removes attention heads
+        from the shared layers, so from every repetition. Pruning is applied to the loaded weights and kept in
+        the config of ``text_embedding``.
+
+        Options left None keep their current setting, ``reset_inference`` goes back to all layers without
+        early exit.
+        """
+        if num_layers is not None and not 0 < num_layers <= self.text_embedding.config.num_hidden_layers:
+            raise ValueError(f'num_layers must be in [1, {self.text_embedding.config.num_hidden_layers}], '
+                             f'got {num_layers}')
+        if num_layers is not None:
+            self.num_layers = num_layers
+        if exit_threshold is not None:
+            self.exit_threshold = exit_threshold
+        if pruned_heads:
+            self.text_embedding.prune_heads({int(layer): heads for layer, heads in pruned_heads.items()})
+            self.head_mask = None
+
+    def reset_inference(self) -> None:
+        """Runs all layer repetitions without early exit again, pruned heads stay pruned."""
+        self.num_layers = None
+        self.exit_threshold = None
+
+    def inference_config(self) -> Dict:
+        return {'num_layers': self.num_layers,
+                'exit_threshold': self.exit_threshold,
+                'pruned_heads': {str(layer): sorted(heads)
+                                 for layer, heads in self.text_embedding.config.pruned_heads.items()}}
+
+    def save_inference_config(self,
+                              path: str = None,
+                              **metrics) -> None:
+        """Writes the inference options (with optional dev metrics) as JSON, e.g. next to the checkpoint."""
+        with open(path, 'w', encoding='UTF-8') as f:
+            json.dump(dict(self.inference_config(), **metrics), f, indent=2)
+
+    def load_inference_config(self,
+                              path: str = None) -> None:
+        """Applies the options written by ``save_inference_config``, after the checkpoint weights are loaded."""
+        with open(path, encoding='UTF-8') as f:
+            inference_config = json.load(f)
+        self.reset_inference()
+        self.configure_inference(num_layers=inference_config['num_layers'],
+                                 exit_threshold=inference_config['exit_threshold'],
+                                 pruned_heads=inference_config['pruned_heads'])
+
+    @classmethod
+    def from_bundle(cls,
+                    path: str = None,
+                    **kwargs) -> 'KbAlbertClassificationModel':
+        """
+        Builds the model for scoring from a bundle written by ``export_bundle``: no dataset is read, no weight
+        is initialized, copied or unpickled, and the saved inference options are applied.
+        """
+        bundle = ModelBundle(path)
+        with skip_init():
+            model = cls(model_path=path, num_classes=bundle.json('num_classes'), **kwargs)
+        assign_tensors(model, bundle.tensors())
+        inference_config = bundle.json('inference_config') or {}
+        # pruned heads are part of the ALBERT config, the encoder was built pruned
+        model.configure_inference(num_layers=inference_config.get('num_layers'),
+                                  exit_threshold=inference_config.get('exit_threshold'))
+        model.eval()
+        return model
+
+    def export_bundle(self,
+                      path: str = None,
+                      tokenizer_config: Dict = None,
+                      vocab_path: str = None) -> None:
+        """Writes the encoder, classifier, tokenizer config, vocabulary and inference options as one file."""
+        save_bundle(path,
+                    self.state_dict(),
+                    self.text_embedding.config,
+                    tokenizer_config,
+                    vocab_path,
+                    num_classes=self.num_classes,
+                    inference_config=self.inference_config())
+
+    def _pool(self,
+              hidden_states: Tensor = None) -> Tensor:
+        return self.text_embedding.pooler_activation(self.text_embedding.pooler(hidden_states[:, 0]))
+
+    # the AlbertModel forward unrolled, to stop after num_layers repetitions or once confident
+    def _embed_input(self,
+                     batch: Dict = None) -> Tuple[Tensor, Tensor]:
+        albert = self.text_embedding
+        hidden_states = albert.encoder.embedding_hidden_mapping_in(albert.embeddings(batch['input_ids']))
+        attention_mask = batch['attention_mask'][:, None, None, :].to(dtype=hidden_states.dtype)
+        attention_mask = (1.0 - attention_mask) * -10000.0
+        return hidden_states, attention_mask
+
+    def _apply_layer(self,
+                     layer_idx: int = None,
+                     hidden_states: Tensor = None,
+                     attention_mask: Tensor = None) -> Tensor:
+        config = self.text_embedding.config
+        group_idx = layer_idx // (config.num_hidden_layers // config.num_hidden_groups)
+        head_mask = [None] * config.inner_group_num
+        if self.head_mask is not None:
+            head_mask = [self.head_mask[group_idx * config.inner_group_num + inner_idx].view(1, -1, 1, 1)
+                         for inner_idx in range(config.inner_group_num)]
+        return self.text_embedding.encoder.albert_layer_groups[group_idx](hidden_states,
+                                                                         attention_mask,
+                                                                         head_mask)[0]
+
+    def _forward_early_exit(self,
+                            batch: Dict = None) -> Tensor:
+        num_layers = self.num_layers or self.text_embedding.config.num_hidden_layers
+        hidden_states, attention_mask = self._embed_input(batch)
+        logits = hidden_states.new_zeros(len(hidden_states), self.num_classes)
+        active = torch.arange(len(hidden_states), device=hidden_states.device)
+        for layer_idx in range(num_layers):
+            hidden_states = self._apply_layer(layer_idx, hidden_states, attention_mask)
+            layer_logits = self.classifier(self._pool(hidden_states))
+            if layer_idx + 1 == num_layers:
+                logits[active] = layer_logits
+                break
+
+            confident = torch.softmax(layer_logits, dim=-1).max(dim=-1)[0] >= self.exit_threshold
+            logits[active[confident]] = layer_logits[confident]
+            active = active[~confident]
+            hidden_states = hidden_states[~confident]
+            attention_mask = attention_mask[~confident]
+            if len(active) == 0:
+                break
         return logits
 
+    def _generator(self) -> torch.Generator:
+        # data loaders draw their worker seeds from this generator instead of the global RNG,
+        # which would otherwise shift the dropout masks of a resumed run
+        generator = torch.Generator()
+        generator.manual_seed(self.seed)
+        return generator
+
+    def on_train_start(self) -> None:
+        # runs in every training process, so each DDP process on CPU gets its own share of the cores
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+    def on_epoch_start(self) -> None:
+        self.train_sampler.set_epoch(self.current_epoch)
+
     def train_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
-        if self.cuda_device > 0:
-            sampler = DistributedSampler(self.train_dataset)
-        else:
-            sampler = RandomSampler(self.train_dataset)
+        # shard by the process group rather than the device count, single GPU runs have no process group
+        # and CPU DDP runs have no GPU
+        if dist.is_available() and dist.is_initialized():
+            self.train_sampler.shard(dist.get_world_size(), dist.get_rank())
 
         train_dataloader = DataLoader(self.train_dataset,
-                                      sampler=sampler,
+                                      sampler=self.train_sampler,
                                       batch_size=self.batch_size,
-                                      num_workers=self.num_workers)
+                                      num_workers=self.num_workers,
+                                      generator=self._generator())
         return train_dataloader
 
     def val_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
@@ -82,7 +275,8 @@ class KbAlbertClassificationModel(LightningModule):
         val_dataloader = DataLoader(self.val_dataset,
                                     sampler=sampler,
                                     batch_size=self.batch_size,
-                                    num_workers=self.num_workers)
+                                    num_workers=self.num_workers,
+                                    generator=self._generator())
         return val_dataloader
 
     def test_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
@@ -91,7 +285,8 @@ class KbAlbertClassificationModel(LightningModule):
         test_dataloader = DataLoader(self.test_dataset,
                                     sampler=sampler,
                                     batch_size=self.batch_size,
-                                    num_workers=self.num_workers)
+                                    num_workers=self.num_workers,
+                                    generator=self._generator())
         return test_dataloader
 
     def configure_optimizers(self) -> Optional[
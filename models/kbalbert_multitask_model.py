@@ -0,0 +1,145 @@
+from typing import Any, Tuple, Dict, Union, List
+
+import torch
+from torch import nn, Tensor
+from torch.nn import CrossEntropyLoss
+from pytorch_lightning.metrics.functional import accuracy, precision, recall
+from pytorch_lightning import TrainResult, EvalResult
+from transformers import AlbertTokenizer
+
+from models.kbalbert_model import KbAlbertClassificationModel
+
+NUM_MAJOR_CLASSES = 3
+NUM_MINOR_CLASSES = 4
+
+
+class KbAlbertMultiTaskModel(KbAlbertClassificationModel):
+    """
+    Predicts the major and the minor label in a single encoder pass. The ``text_embedding`` is shared,
+    ``classifier`` is the major head (same shape as the major model) and ``minor_classifier`` the minor head.
+    The training loss is ``major_loss_weight * major_loss + (1 - major_loss_weight) * minor_loss``.
+    """
+    def __init__(self,
+                 train_path: str = None,
+                 dev_path: str = None,
+                 test_path: str = None,
+                 model_path: str = None,
+                 config_path: str = None,
+                 tokenizer: AlbertTokenizer = None,
+                 cuda_device: int = 0,
+                 batch_size: int = 4,
+                 num_workers: int = 0,
+                 lr: float = 2e-5,
+                 weight_decay: float = 0.1,
+                 warm_up: int = 20,
+                 cache_dir: str = None,
+                 seed: int = 42,
+                 max_length: int = 512,
+                 num_threads: int = None,
+                 major_loss_weight: float = 0.5):
+        super(KbAlbertMultiTaskModel, self).__init__(train_path=train_path,
+                                                     dev_path=dev_path,
+                                                     test_path=test_path,
+                                                     model_path=model_path,
+                                                     config_path=config_path,
+                                                     tokenizer=tokenizer,
+                                                     num_classes=NUM_MAJOR_CLASSES,
+                                                     cuda_device=cuda_device,
+                                                     batch_size=batch_size,
+                                                     num_workers=num_workers,
+                                                     lr=lr,
+                                                     weight_decay=weight_decay,
+                                                     warm_up=warm_up,
+                                                     cache_dir=cache_dir,
+                                                     seed=seed,
+                                                     max_length=max_length,
+                                                     num_threads=num_threads)
+
+        self.major_loss_weight = major_loss_weight
+
+        # the shared arguments were saved by the parent, add only the multi task ones
+        self.save_hyperparameters('major_loss_weight')
+
+        self.minor_classifier = nn.Linear(self.classifier_hidden_size, NUM_MINOR_CLASSES)
+
+    def forward(self,
+                batch: Dict = None) -> Tuple[Tensor, Tensor]:
+        text_embedded = self.text_embedding(batch['input_ids'],
+                                            token_type_ids=None,
+                                            attention_mask=batch['attention_mask'])
+
+        major_logits = self.classifier(text_embedded[1])
+        minor_logits = self.minor_classifier(text_embedded[1])
+
+        return major_logits, minor_logits
+
+    def _compute_losses(self,
+                        batch: Dict = None) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+        major_logits, minor_logits = self.forward(batch)
+        loss_fct = CrossEntropyLoss()
+        major_loss = loss_fct(major_logits.view(-1, NUM_MAJOR_CLASSES), batch['label_major'].view(-1))
+        minor_loss = loss_fct(minor_logits.view(-1, NUM_MINOR_CLASSES), batch['label_minor'].view(-1))
+        loss = self.major_loss_weight * major_loss + (1. - self.major_loss_weight) * minor_loss
+
+        return loss, major_loss, minor_loss, major_logits, minor_logits
+
+    def _evaluate(self,
+                  batch: Dict = None,
+                  prefix: str = None) -> Dict[str, Tensor]:
+        loss, major_loss, minor_loss, major_logits, minor_logits = self._compute_losses(batch)
+
+        outputs = {f'{prefix}_loss': loss,
+                   f'{prefix}_loss_major': major_loss,
+                   f'{prefix}_loss_minor': minor_loss}
+        for task, logits, num_classes in [('major', major_logits, NUM_MAJOR_CLASSES),
+                                          ('minor', minor_logits, NUM_MINOR_CLASSES)]:
+            labels = batch[f'label_{task}'].view(-1)
+            preds = torch.argmax(logits, dim=1)
+            outputs[f'{prefix}_acc_{task}'] = accuracy(preds, labels, num_classes=num_classes)
+            outputs[f'{prefix}_pr_{task}'] = precision(preds, labels, num_classes=num_classes)
+            outputs[f'{prefix}_rc_{task}'] = recall(preds, labels, num_classes=num_classes)
+        return outputs
+
+    @staticmethod
+    def _average(outputs: List[Dict[str, Tensor]] = None,
+                 prefix: str = None) -> Dict[str, Dict[str, Tensor]]:
+        logs = {f'avg_{name}': torch.stack([x[name] for x in outputs]).mean() for name in outputs[0]}
+        return {f'{prefix}_loss': logs[f'avg_{prefix}_loss'], 'log': logs}
+
+    def training_step(self,
+                      batch: Dict = None,
+                      batch_idx: int = None) -> Dict[str, Tensor]:
+        loss, major_loss, minor_loss, _, _ = self._compute_losses(batch)
+
+        nn.utils.clip_grad_norm_(self.parameters(), 1.0)
+
+        return {'loss': loss,
+                'loss_major': major_loss.detach(),
+                'loss_minor': minor_loss.detach()}
+
+    def training_epoch_end(
+            self, outputs: Union[TrainResult, List[TrainResult]]
+    ) -> Dict[str, Dict[str, Tensor]]:
+        # the training step outputs have no prefix
+        return self._average([{f'train_{name}': value for name, value in x.items()} for x in outputs], 'train')
+
+    def validation_step(self,
+                        batch: Dict = None,
+                        batch_idx: int = None) -> Dict[str, Tensor]:
+        return self._evaluate(batch, 'val')
+
+    def validation_epoch_end(
+            self,
+            outputs: Union[List[Dict[str, Tensor]], List[List[Dict[str, Tensor]]]]
+    ) -> Dict[str, Dict[str, Tensor]]:
+        return self._average(outputs, 'val')
+
+    def test_step(self,
+                  batch: Dict = None,
+                  batch_idx: int = None) -> Dict[str, Tensor]:
+        return self._evaluate(batch, 'test')
+
+    def test_epoch_end(
+            self, outputs: Union[EvalResult, List[EvalResult]]
+    ) -> Dict[str, Union[Dict[str, Any], Any]]:
+        return self._average(outputs, 'test')
@@ -0,0 +1,223 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import json
+
+import torch
+from torch import nn, Tensor
+from torch.optim import Optimizer
+from torch.utils.data import DataLoader, RandomSampler, SequentialSampler
+from torch.nn import CrossEntropyLoss
+from pytorch_lightning.core.lightning import LightningModule
+from pytorch_lightning.metrics.functional import accuracy, precision, recall
+from pytorch_lightning import TrainResult, EvalResult
+from transformers import AlbertTokenizer, AlbertConfig, AlbertModel, AdamW
+
+from dataset_readers.sentence_dataset import KbAlbertSentenceDataset, collate_sentences
+from models.sentence_encoder import SentenceEncoder
+
+
+class AttentionPooling(nn.Module):
+    """Weighted average of the sentence vectors with weights scored from the vectors themselves."""
+    def __init__(self,
+                 hidden_size: int = None) -> None:
+        super(AttentionPooling, self).__init__()
+        self.attention = nn.Sequential(nn.Linear(hidden_size, hidden_size),
+                                       nn.Tanh(),
+                                       nn.Linear(hidden_size, 1))
+
+    def forward(self,
+                sentence_vectors: Tensor = None,
+                sentence_mask: Tensor = None) -> Tensor:
+        scores = self.attention(sentence_vectors).squeeze(-1)
+        scores = scores.masked_fill(sentence_mask == 0, float('-inf'))
+        weights = torch.softmax(scores, dim=-1)
+        return torch.bmm(weights.unsqueeze(1), sentence_vectors).squeeze(1)
+
+
+class KbAlbertSentenceModel(LightningModule):
+    """
+    Classifies a decision from the vectors of its sentences instead of one 512 token block. The
+    ``text_embedding`` is frozen and only used through a ``SentenceEncoder``, whose cache keeps the vector of
+    every sentence seen so far; an attention pooling aggregator and the classifier on top are trained.
+    Scoring a new decision with ``predict`` only encodes the sentences which changed since the earlier ones.
+    """
+    def __init__(self,
+                 train_path: str = None,
+                 dev_path: str = None,
+                 test_path: str = None,
+                 model_path: str = None,
+                 config_path: str = None,
+                 tokenizer: AlbertTokenizer = None,
+                 num_classes: int = 3,
+                 batch_size: int = 16,
+                 num_workers: int = 0,
+                 lr: float = 1e-3,
+                 weight_decay: float = 0.01,
+                 sentence_max_length: int = 128,
+                 max_sentences: int = 64,
+                 sentence_cache_path: str = None,
+                 seed: int = 42):
+        super(KbAlbertSentenceModel, self).__init__()
+
+        self.num_classes = num_classes
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.lr = lr
+        self.weight_decay = weight_decay
+        self.max_sentences = max_sentences
+        self.seed = seed
+
+        self.save_hyperparameters()
+
+        with open(config_path, encoding='UTF-8') as f:
+            config = AlbertConfig(**json.load(f))
+        self.text_embedding = AlbertModel.from_pretrained(pretrained_model_name_or_path=model_path,
+                                                          config=config)
+        for param in self.text_embedding.parameters():
+            param.requires_grad = False
+        self.sentence_encoder = SentenceEncoder(self.text_embedding,
+                                                tokenizer,
+                                                max_length=sentence_max_length,
+                                                cache_path=sentence_cache_path)
+
+        self.train_dataset = KbAlbertSentenceDataset(train_path, self.sentence_encoder, max_sentences)
+        self.val_dataset = KbAlbertSentenceDataset(dev_path, self.sentence_encoder, max_sentences)
+        self.test_dataset = KbAlbertSentenceDataset(test_path, self.sentence_encoder, max_sentences) \
+            if test_path else None
+        self.sentence_encoder.save()
+
+        hidden_size = self.text_embedding.config.hidden_size
+        self.aggregator = AttentionPooling(hidden_size)
+        self.dropout = nn.Dropout(self.text_embedding.config.classifier_dropout_prob)
+        self.classifier = nn.Linear(hidden_size, self.num_classes)
+
+    def forward(self,
+                batch: Dict = None) -> Tensor:
+        document_vectors = self.aggregator(batch['sentence_vectors'], batch['sentence_mask'])
+        logits = self.classifier(self.dropout(document_vectors))
+
+        return logits
+
+    def predict(self,
+                texts: List[str] = None) -> Tensor:
+        """Returns the logits of the given decisions, encoding only their uncached sentences."""
+        num_encoded = self.sentence_encoder.num_encoded
+        vectors = self.sentence_encoder.encode_documents(texts)
+        # keep the new sentences for the next scoring run
+        if self.sentence_encoder.num_encoded > num_encoded:
+            self.sentence_encoder.save()
+        batch = collate_sentences([{'sentence_vectors': sentence_vectors[:self.max_sentences]}
+                                   for sentence_vectors in vectors])
+        self.eval()
+        with torch.no_grad():
+            device = self.classifier.weight.device
+            return self.forward({name: tensor.to(device) for name, tensor in batch.items()})
+
+    def _generator(self) -> torch.Generator:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed)
+        return generator
+
+    def train_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
+        train_dataloader = DataLoader(self.train_dataset,
+                                      sampler=RandomSampler(self.train_dataset, generator=self._generator()),
+                                      batch_size=self.batch_size,
+                                      num_workers=self.num_workers,
+                                      collate_fn=collate_sentences)
+        return train_dataloader
+
+    def val_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
+        val_dataloader = DataLoader(self.val_dataset,
+                                    sampler=SequentialSampler(self.val_dataset),
+                                    batch_size=self.batch_size,
+                                    num_workers=self.num_workers,
+                                    collate_fn=collate_sentences)
+        return val_dataloader
+
+    def test_dataloader(self) -> Union[DataLoader, List[DataLoader]]:
+        test_dataloader = DataLoader(self.test_dataset,
+                                     sampler=SequentialSampler(self.test_dataset),
+                                     batch_size=self.batch_size,
+                                     num_workers=self.num_workers,
+                                     collate_fn=collate_sentences)
+        return test_dataloader
+
+    def configure_optimizers(self) -> Optional[
+        Union[
+            Optimizer, Sequence[Optimizer], Dict, Sequence[Dict], Tuple[List, List]
+        ]
+    ]:
+        no_decay = ['bias']
+        named_parameters = [(n, p) for n, p in self.named_parameters() if p.requires_grad]
+        optimizer_grouped_parameters = [
+            {'params': [p for n, p in named_parameters if not any(nd in n for nd in no_decay)],
+             'weight_decay': self.weight_decay},
+            {'params': [p for n, p in named_parameters if any(nd in n for nd in no_decay)], 'weight_decay': 0.0}
+        ]
+        optimizer = AdamW(optimizer_grouped_parameters,
+                          lr=self.lr,
+                          eps=1e-8)
+        return optimizer
+
+    def _labels(self,
+                batch: Dict = None) -> Tensor:
+        if self.num_classes == 3:
+            return batch['label_major'].view(-1)
+        return batch['label_minor'].view(-1)
+
+    def training_step(self,
+                      batch: Dict = None,
+                      batch_idx: int = None) -> Dict[str, Tensor]:
+        logits = self.forward(batch)
+        loss_fct = CrossEntropyLoss()
+        loss = loss_fct(logits.view(-1, self.num_classes), self._labels(batch))
+
+        return {'loss': loss}
+
+    def training_epoch_end(
+            self, outputs: Union[TrainResult, List[TrainResult]]
+    ) -> Dict[str, Dict[str, Tensor]]:
+        avg_loss = torch.stack([x['loss'] for x in outputs]).mean()
+
+        logs = {'avg_train_loss': avg_loss}
+        return {'train_loss': avg_loss, 'log': logs}
+
+    def _evaluate(self,
+                  batch: Dict = None,
+                  prefix: str = None) -> Dict[str, Tensor]:
+        logits = self.forward(batch)
+        labels = self._labels(batch)
+        loss_fct = CrossEntropyLoss()
+        loss = loss_fct(logits.view(-1, self.num_classes), labels)
+
+        preds = torch.argmax(logits, dim=1)
+        return {f'{prefix}_loss': loss,
+                f'{prefix}_acc': accuracy(preds, labels, num_classes=self.num_classes),
+                f'{prefix}_pr': precision(preds, labels, num_classes=self.num_classes),
+                f'{prefix}_rc': recall(preds, labels, num_classes=self.num_classes)}
+
+    @staticmethod
+    def _average(outputs: List[Dict[str, Tensor]] = None,
+                 prefix: str = None) -> Dict[str, Dict[str, Tensor]]:
+        logs = {f'avg_{name}': torch.stack([x[name] for x in outputs]).mean() for name in outputs[0]}
+        return {f'{prefix}_loss': logs[f'avg_{prefix}_loss'], 'log': logs}
+
+    def validation_step(self,
+                        batch: Dict = None,
+                        batch_idx: int = None) -> Dict[str, Tensor]:
+        return self._evaluate(batch, 'val')
+
+    def validation_epoch_end(
+            self,
+            outputs: Union[List[Dict[str, Tensor]], List[List[Dict[str, Tensor]]]]
+    ) -> Dict[str, Dict[str, Tensor]]:
+        return self._average(outputs, 'val')
+
+    def test_step(self,
+                  batch: Dict = None,
+                  batch_idx: int = None) -> Dict[str, Tensor]:
+        return self._evaluate(batch, 'test')
+
+    def test_epoch_end(
+            self, outputs: Union[EvalResult, List[EvalResult]]
+    ) -> Dict[str, Union[Dict[str, Any], Any]]:
+        return self._average(outputs, 'test')
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, Iterator
+
+import numpy as np
+import torch
+from torch import nn, Tensor
+from safetensors.torch import save_file
+from transformers import AlbertConfig
+from transformers.modeling_albert import AlbertPreTrainedModel
+
+from preprocess import KbAlbertCharTokenizer
+
+BUNDLE_FORMAT = 'kbalbert-bundle-1'
+
+# safetensors dtype names to numpy, the tensors are read through numpy to stay zero copy on older torch
+DTYPES = {'F64': np.float64, 'F32': np.float32, 'F16': np.float16,
+          'I64': np.int64, 'I32': np.int32, 'I16': np.int16, 'I8': np.int8, 'U8': np.uint8, 'BOOL': np.bool_}
+
+
+def save_bundle(path: str = None,
+                state_dict: Dict[str, Tensor] = None,
+                albert_config: AlbertConfig = None,
+                tokenizer_config: Dict = None,
+                vocab_path: str = None,
+                **metadata) -> None:
+    """
+    Writes the weights as one safetensors file with the ALBERT config, the tokenizer config and the vocabulary
+    (plus any ``metadata``, JSON encoded) in its header, so the file alone is enough to score.
+    """
+    tensors = {}
+    data_ptrs = set()
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu().contiguous()
+        # safetensors refuses tensors sharing memory, tied weights are stored twice
+        if tensor.data_ptr() in data_ptrs:
+            tensor = tensor.clone()
+        data_ptrs.add(tensor.data_ptr())
+        tensors[name] = tensor
+
+    with open(vocab_path, encoding='utf-8') as f:
+        vocab = f.read()
+    header = {'format': BUNDLE_FORMAT,
+              'albert_config': albert_config.to_json_string(),
+              'tokenizer_config': json.dumps(tokenizer_config or {}, ensure_ascii=False),
+              'vocab': vocab}
+    header.update({name: json.dumps(value, ensure_ascii=False) for name, value in metadata.items()})
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    save_file(tensors, path + '.tmp', metadata=header)
+    os.replace(path + '.tmp', path)
+
+
+def is_bundle_path(path: str = None) -> bool:
+    return path is not None and path.endswith('.safetensors')
+
+
+class ModelBundle:
+    """
+    Reads a bundle written by ``save_bundle``. The file is memory mapped and every tensor is a view on the
+    mapping: nothing is copied or unpickled, and pages are only read from disk when the weights are used.
+    The mapping is copy on write, so training from a bundle updates private pages and never the file.
+    """
+    def __init__(self,
+                 path: str = None) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            header_size = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(header_size))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._data_offset = 8 + header_size
+        self.metadata = header.pop('__metadata__', {})
+        if self.metadata.get('format') != BUNDLE_FORMAT:
+            raise ValueError(f'{path} is not a model bundle')
+        self._entries = header
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def tensor(self,
+               name: str = None) -> Tensor:
+        entry = self._entries[name]
+        start, end = entry['data_offsets']
+        dtype = DTYPES[entry['dtype']]
+        array = np.frombuffer(self._mmap, dtype=dtype, count=(end - start) // np.dtype(dtype).itemsize,
+                              offset=self._data_offset + start)
+        return torch.from_numpy(array).view(entry['shape'])
+
+    def tensors(self,
+                prefix: str = '') -> Dict[str, Tensor]:
+        """Tensors whose name starts with ``prefix``, keyed by the rest of the name."""
+        return {name[len(prefix):]: self.tensor(name) for name in self._entries if name.startswith(prefix)}
+
+    def json(self,
+             name: str = None):
+        return json.loads(self.metadata[name]) if name in self.metadata else None
+
+    def albert_config(self) -> AlbertConfig:
+        config_dict = json.loads(self.metadata['albert_config'])
+        # JSON turned the layer keys of the pruned heads into strings
+        config_dict['pruned_heads'] = {int(layer): heads
+                                       for layer, heads in config_dict.get('pruned_heads', {}).items()}
+        return AlbertConfig(**config_dict)
+
+    def tokenizer(self) -> KbAlbertCharTokenizer:
+        # the tokenizer reads its vocabulary from a file
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vocab_path = os.path.join(tmp_dir, 'vocab.txt')
+            with open(vocab_path, 'w', encoding='utf-8') as f:
+                f.write(self.metadata['vocab'])
+            return KbAlbertCharTokenizer(vocab_file=vocab_path,
+                                         pretrained_init_configuration=self.json('tokenizer_config'))
+
+
+@contextlib.contextmanager
+def skip_init():
+    """Builds modules without initializing their weights, for weights which are assigned right after."""
+    saved = [(nn.Linear, nn.Linear.reset_parameters),
+             (nn.Embedding, nn.Embedding.reset_parameters),
+             (nn.LayerNorm, nn.LayerNorm.reset_parameters),
+             (AlbertPreTrainedModel, AlbertPreTrainedModel._init_weights)]
+    nn.Linear.reset_parameters = lambda self: None
+    nn.Embedding.reset_parameters = lambda self: None
+    nn.LayerNorm.reset_parameters = lambda self: None
+    AlbertPreTrainedModel._init_weights = lambda self, module: None
+    try:
+        yield
+    finally:
+        for cls, method in saved:
+            setattr(cls, method.__name__, method)
+
+
+def assign_tensors(module: nn.Module = None,
+                   tensors: Dict[str, Tensor] = None) -> None:
+    """
+    Points the parameters and buffers of ``module`` at the given tensors instead of copying into them like
+    ``load_state_dict`` does. Every parameter and buffer of the state dict must be given with its shape.
+    """
+    state_dict = module.state_dict()
+    missing = set(state_dict) - set(tensors)
+    unexpected = set(tensors) - set(state_dict)
+    if missing or unexpected:
+        raise ValueError(f'Bundle does not match the model, missing {sorted(missing)}, '
+                         f'unexpected {sorted(unexpected)}')
+
+    for name, tensor in tensors.items():
+        if tuple(state_dict[name].shape) != tuple(tensor.shape):
+            raise ValueError(f'Shape of {name} is {tuple(tensor.shape)} in the bundle, '
+                             f'{tuple(state_dict[name].shape)} in the model')
+        *path, attr = name.split('.')
+        owner = module
+        for part in path:
+            owner = getattr(owner, part)
+        if attr in owner._parameters:
+            owner._parameters[attr] = nn.Parameter(tensor, requires_grad=owner._parameters[attr].requires_grad)
+        else:
+            owner._buffers[attr] = tensor
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+from typing import List
+
+import torch
+from torch import Tensor
+from transformers import AlbertModel, AlbertTokenizer
+
+from preprocess.sentences import split_sentences
+
+logger = logging.getLogger(__name__)
+
+
+def encoder_fingerprint(text_embedding: AlbertModel = None,
+                        max_length: int = 128) -> str:
+    """Hash of the encoder weights and the sentence length, cached vectors are only valid for both."""
+    sha = hashlib.sha1()
+    for name, tensor in sorted(text_embedding.state_dict().items()):
+        sha.update(name.encode('utf-8'))
+        sha.update(tensor.detach().cpu().numpy().tobytes())
+    sha.update(str(max_length).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class SentenceEncoder:
+    """
+    Encodes sentences with the pooler output of a (frozen) ``text_embedding``, keeping every vector under
+    the hash of its sentence. Consecutive decisions repeat most of their boilerplate, so encoding a new
+    decision only runs the encoder on the sentences which are not in the cache yet.
+
+    With ``cache_path`` the cache is loaded from and saved to disk, a cache written by other encoder
+    weights is discarded.
+    """
+    def __init__(self,
+                 text_embedding: AlbertModel = None,
+                 tokenizer: AlbertTokenizer = None,
+                 max_length: int = 128,
+                 batch_size: int = 32,
+                 cache_path: str = None) -> None:
+        self.text_embedding = text_embedding
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.cache_path = cache_path
+        self.fingerprint = encoder_fingerprint(text_embedding, max_length)
+        self.num_encoded = 0
+        self.num_reused = 0
+
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            state = torch.load(cache_path)
+            if state['fingerprint'] == self.fingerprint:
+                self.cache = state['vectors']
+                logger.info(f'Loaded {len(self.cache)} sentence vectors from {cache_path}')
+            else:
+                logger.info(f'Discarding the sentence vectors of other encoder weights at {cache_path}')
+
+    @staticmethod
+    def sentence_key(sentence: str = None) -> str:
+        return hashlib.sha1(sentence.encode('utf-8')).hexdigest()
+
+    def encode(self,
+               sentences: List[str] = None) -> Tensor:
+        """Returns the ``[len(sentences), hidden_size]`` vectors, encoding only the uncached sentences."""
+        keys = [self.sentence_key(sentence) for sentence in sentences]
+        missing = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in self.cache:
+                missing.setdefault(key, sentence)
+        self.num_encoded += len(missing)
+        self.num_reused += len(keys) - len(missing)
+
+        if missing:
+            self.text_embedding.eval()
+            missing_keys = list(missing)
+            with torch.no_grad():
+                for start in range(0, len(missing_keys), self.batch_size):
+                    batch_keys = missing_keys[start:start + self.batch_size]
+                    # sentences are short, pad to the longest of the batch instead of max_length
+                    encoded = self.tokenizer([missing[key] for key in batch_keys],
+                                             add_special_tokens=True,
+                                             max_length=self.max_length,
+                                             truncation=True,
+                                             padding=True,
+                                             return_attention_mask=True,
+                                             return_tensors='pt')
+                    text_embedded = self.text_embedding(encoded['input_ids'].to(self.text_embedding.device),
+                                                        token_type_ids=None,
+                                                        attention_mask=encoded['attention_mask'].to(
+                                                            self.text_embedding.device))
+                    for key, vector in zip(batch_keys, text_embedded[1].float().cpu()):
+                        self.cache[key] = vector.clone()
+
+        if not keys:
+            return torch.zeros(0, self.text_embedding.config.hidden_size)
+        return torch.stack([self.cache[key] for key in keys])
+
+    def encode_documents(self,
+                         texts: List[str] = None) -> List[Tensor]:
+        """Splits every text into sentences and returns a ``[num_sentences, hidden_size]`` tensor per text."""
+        # an empty text is kept as one (empty) sentence so every document has a vector to pool
+        documents = [split_sentences(text) or [text] for text in texts]
+        vectors = self.encode([sentence for sentences in documents for sentence in sentences])
+        return list(torch.split(vectors, [len(sentences) for sentences in documents]))
+
+    def save(self) -> None:
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        torch.save({'fingerprint': self.fingerprint, 'vectors': self.cache}, self.cache_path + '.tmp')
+        os.replace(self.cache_path + '.tmp', self.cache_path)
+        logger.info(f'Saved {len(self.cache)} sentence vectors to {self.cache_path}')
@@ -1,4 +1,5 @@
 from preprocess.tokenization_kbalbert import KbAlbertCharTokenizer
+from preprocess.corpus_store import CorpusStore
 
 
-__all__ = ['KbAlbertCharTokenizer']
\ No newline at end of file
+__all__ = ['KbAlbertCharTokenizer', 'CorpusStore']
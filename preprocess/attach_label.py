@@ -1,45 +1,42 @@
 import csv
 import json
 
+import pyarrow as pa
+import pyarrow.compute as pc
 from absl import app, flags, logging
-from tqdm import tqdm
+
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+from preprocess.labeling import ANNOTATION_COLUMNS, annotations_to_table, label_table
 
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string('input_path', default=None,
-                    help='Path of input file')
+                    help='Path of input file (annotated .csv or .parquet corpus store)')
 flags.DEFINE_string('output_path', default=None,
-                    help='Path of output file')
+                    help='Path of output file (.jsonl or .parquet corpus store)')
 
 
 def main(argv):
     logging.info(f'Labeling {FLAGS.input_path}')
-    with open(FLAGS.input_path, 'r') as input_file,\
-            open(FLAGS.output_path, 'w') as output_file:
-        reader = csv.reader(input_file)
-        next(reader, None)
-        for line in tqdm(reader, desc='labeling'):
-            labeled_data = {'date': line[0].strip(),
-                            'text': line[1].strip(),
-                            'major_direction': line[2].strip(),
-                            'voting': line[3].strip(),
-                            'minor_direction': line[4].strip()}
-            # labeling major class
-            if line[2] == 'fall':
-                labeled_data['label_major'] = 0
-            elif line[2] == 'freeze':
-                labeled_data['label_major'] = 1
-            else:
-                labeled_data['label_major'] = 2
-            # labeling minor class
-            if line[4] == 'fall':
-                labeled_data['label_minor'] = 0
-            elif line[4] == 'freeze':
-                labeled_data['label_minor'] = 1
-            elif line[4] == 'rise':
-                labeled_data['label_minor'] = 2
-            else:
-                labeled_data['label_minor'] = 3
+    if is_corpus_path(FLAGS.input_path):
+        store = CorpusStore(FLAGS.input_path)
+        table = store.read(columns=[name for name in ANNOTATION_COLUMNS if name in store.schema.names])
+        table = table.set_column(0, 'date', pc.strftime(pc.cast(table.column('date'), pa.timestamp('s')),
+                                                        format='%Y%m%d'))
+    else:
+        with open(FLAGS.input_path, 'r') as input_file:
+            reader = csv.reader(input_file)
+            next(reader, None)
+            table = annotations_to_table(list(reader))
+
+    labeled = label_table(table)
+
+    if is_corpus_path(FLAGS.output_path):
+        CorpusStore(FLAGS.output_path).write(labeled)
+        return
+
+    with open(FLAGS.output_path, 'w') as output_file:
+        for labeled_data in labeled.to_pylist():
             output_file.write(json.dumps(labeled_data, ensure_ascii=False))
             output_file.write('\n')
 
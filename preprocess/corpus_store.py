@@ -0,0 +1,161 @@
+"""
+Arrow/Parquet backed corpus store shared by the preprocessing stages and the dataset reader.
+"""
+import datetime
+import logging
+import os
+import warnings
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import torch
+
+logger = logging.getLogger(__name__)
+
+CORPUS_SCHEMA = pa.schema([
+    pa.field('date', pa.date32()),
+    pa.field('text', pa.string()),
+    pa.field('major_direction', pa.string()),
+    pa.field('voting', pa.string()),
+    pa.field('minor_direction', pa.string()),
+    pa.field('label_major', pa.int8()),
+    pa.field('label_minor', pa.int8()),
+    pa.field('num_majority_votes', pa.int8()),
+    pa.field('num_dissents', pa.int8()),
+])
+
+
+def is_corpus_path(path: str = None) -> bool:
+    """Returns whether the path points to a parquet corpus store rather than a csv/jsonl file."""
+    return path is not None and str(path).endswith('.parquet')
+
+
+def parse_date(value: Union[str, datetime.date] = None) -> Optional[datetime.date]:
+    """Parses a ``YYYYMMDD`` (or ``YYYY-MM-DD``) string into a date."""
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value.strip().replace('-', ''), '%Y%m%d').date()
+
+
+def conform_table(table: pa.Table = None) -> pa.Table:
+    """Casts the known columns to the corpus schema, parsing ``YYYYMMDD`` date strings."""
+    for idx, field in enumerate(table.schema):
+        if field.name not in CORPUS_SCHEMA.names:
+            continue
+        target = CORPUS_SCHEMA.field(field.name)
+        column = table.column(idx)
+        if field.name == 'date' and pa.types.is_string(field.type):
+            column = pc.strptime(column, format='%Y%m%d', unit='s')
+        if column.type != target.type:
+            table = table.set_column(idx, target, pc.cast(column, target.type))
+    return table
+
+
+def token_fields(max_length: int = 512) -> List[pa.Field]:
+    """Columns holding the tokenized text, padded to ``max_length`` so they can be loaded without a copy."""
+    return [pa.field('input_ids', pa.list_(pa.int64(), max_length)),
+            pa.field('num_tokens', pa.int32())]
+
+
+def as_tensor(array: np.ndarray = None) -> torch.Tensor:
+    """Wraps a read-only numpy view of an arrow buffer as a tensor without copying it."""
+    with warnings.catch_warnings():
+        # arrow buffers are immutable, the tensors are never written in place
+        warnings.simplefilter('ignore', UserWarning)
+        return torch.from_numpy(array)
+
+
+def add_token_ids(table: pa.Table = None,
+                  tokenizer=None,
+                  max_length: int = 512) -> pa.Table:
+    """Tokenizes the text column and appends the padded ``input_ids`` and their ``num_tokens``."""
+    for name in ('input_ids', 'num_tokens'):
+        if name in table.column_names:
+            table = table.drop([name])
+    encoded = tokenizer(table.column('text').to_pylist(),
+                        add_special_tokens=True,
+                        max_length=max_length,
+                        truncation=True,
+                        padding='max_length',
+                        return_attention_mask=True)
+    ids = np.asarray(encoded['input_ids'], dtype=np.int64).reshape(-1)
+    num_tokens = np.asarray(encoded['attention_mask'], dtype=np.int32).sum(axis=1)
+
+    ids_field, num_tokens_field = token_fields(max_length)
+    table = table.append_column(ids_field, pa.FixedSizeListArray.from_arrays(pa.array(ids), max_length))
+    return table.append_column(num_tokens_field, pa.array(num_tokens, type=pa.int32()))
+
+
+class CorpusStore:
+    """
+    Parquet file holding the corpus with typed columns (date, text, directions, voting, labels, token ids).
+    Every stage reads only the columns it needs and can restrict rows by date range, which is pushed down
+    to the parquet row group statistics.
+    """
+    def __init__(self,
+                 path: str = None) -> None:
+        self.path = str(path)
+
+    @staticmethod
+    def from_records(records: Sequence[Dict] = None) -> pa.Table:
+        """Builds a table from row dicts, keeping only the known columns which are present in the rows."""
+        names = [name for name in CORPUS_SCHEMA.names if any(name in record for record in records)]
+        columns = {name: [record.get(name) for record in records] for name in names}
+        if 'date' in columns:
+            columns['date'] = [parse_date(date) for date in columns['date']]
+        schema = pa.schema([CORPUS_SCHEMA.field(name) for name in names])
+        return pa.Table.from_pydict(columns, schema=schema)
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pq.read_schema(self.path)
+
+    def __len__(self) -> int:
+        return pq.ParquetFile(self.path).metadata.num_rows
+
+    def write(self,
+              table: pa.Table = None) -> None:
+        table = conform_table(table)
+        if 'date' in table.column_names:
+            table = table.sort_by('date')
+        logger.info(f'Writing {table.num_rows} rows to {self.path}')
+        # write next to the target and swap, the table may still be memory mapped from the same path
+        pq.write_table(table, self.path + '.tmp')
+        os.replace(self.path + '.tmp', self.path)
+
+    def read(self,
+             columns: Optional[List[str]] = None,
+             start_date: Union[str, datetime.date] = None,
+             end_date: Union[str, datetime.date] = None) -> pa.Table:
+        """Reads the given columns of the rows whose date lies in [start_date, end_date]."""
+        filters = []
+        if start_date is not None:
+            filters.append(('date', '>=', parse_date(start_date)))
+        if end_date is not None:
+            filters.append(('date', '<=', parse_date(end_date)))
+        return pq.read_table(self.path,
+                             columns=columns,
+                             filters=filters or None,
+                             memory_map=True)
+
+    @staticmethod
+    def token_ids_from_table(table: pa.Table = None) -> Dict[str, torch.Tensor]:
+        """
+        Converts the token and label columns to tensors sharing memory with the arrow buffers.
+        Returns ``input_ids`` and ``attention_mask`` of shape (num_rows, max_length) and every
+        label column present (``label_major``, ``label_minor``, ``num_dissents``) of shape (num_rows, 1).
+        """
+        input_ids = table.column('input_ids').combine_chunks()
+        max_length = input_ids.type.list_size
+        ids = input_ids.flatten().to_numpy(zero_copy_only=True).reshape(-1, max_length)
+        num_tokens = table.column('num_tokens').to_numpy()
+
+        columns = {'input_ids': as_tensor(ids),
+                   'attention_mask': torch.from_numpy(np.arange(max_length)[None, :] < num_tokens[:, None]).long()}
+        for name in ['label_major', 'label_minor', 'num_dissents']:
+            if name in table.column_names:
+                columns[name] = as_tensor(table.column(name).to_numpy()).long().unsqueeze(1)
+        return columns
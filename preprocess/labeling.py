@@ -0,0 +1,103 @@
+"""
+Vectorized rule-based labeling of the annotated corpus table.
+"""
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+# categorical codes of the direction columns, the position of a value is its label
+MAJOR_LABELS = ['fall', 'freeze', 'rise']
+MINOR_LABELS = ['fall', 'freeze', 'rise', '']  # no minor opinion (unanimous) is the last class
+
+UNANIMOUS = 'unanimous'
+VOTING_PATTERN = r'^(?P<majority>\d+)-(?P<dissent>\d+)$'
+
+ANNOTATION_COLUMNS = ['date', 'text', 'major_direction', 'voting', 'minor_direction']
+
+
+class LabelingError(ValueError):
+    """Raised with every invalid annotation of the table at once."""
+    def __init__(self,
+                 errors: List[str] = None) -> None:
+        self.errors = errors
+        super(LabelingError, self).__init__(f'{len(errors)} invalid annotation(s):\n' + '\n'.join(errors))
+
+
+def encode_categories(column: pa.ChunkedArray = None,
+                      categories: List[str] = None) -> pa.Array:
+    """Maps the values to their index in ``categories``, unknown values become null."""
+    return pc.index_in(column, value_set=pa.array(categories, type=pa.string()))
+
+
+def parse_voting(column: pa.ChunkedArray = None) -> Dict[str, pa.Array]:
+    """
+    Parses the free-form voting column (``unanimous`` or ``<majority>-<dissent>``) into vote counts.
+    ``num_majority_votes`` is null for unanimous decisions, where the number of voters is not recorded.
+    Values matching neither form are null in both columns.
+    """
+    votes = pc.extract_regex(column, VOTING_PATTERN)
+    num_majority_votes = pc.cast(pc.struct_field(votes, 'majority'), pa.int8())
+    num_dissents = pc.cast(pc.struct_field(votes, 'dissent'), pa.int8())
+
+    num_dissents = pc.if_else(pc.equal(column, UNANIMOUS), pa.scalar(0, pa.int8()), num_dissents)
+    return {'num_majority_votes': num_majority_votes,
+            'num_dissents': num_dissents}
+
+
+def annotations_to_table(lines: List[List[str]] = None) -> pa.Table:
+    """Builds a string table of the annotation columns from csv rows, padding rows without annotation."""
+    columns = [[] for _ in ANNOTATION_COLUMNS]
+    for line in lines:
+        line = line + [''] * (len(ANNOTATION_COLUMNS) - len(line))
+        for column, value in zip(columns, line):
+            column.append(value)
+    return pa.table(dict(zip(ANNOTATION_COLUMNS, columns)),
+                    schema=pa.schema([(name, pa.string()) for name in ANNOTATION_COLUMNS]))
+
+
+def label_table(table: pa.Table = None) -> pa.Table:
+    """
+    Labels the whole table at once. Strips the annotation columns, appends ``label_major``,
+    ``label_minor``, ``num_majority_votes`` and ``num_dissents`` and raises a ``LabelingError``
+    listing every row with an unknown direction, an unparsable voting or a minor direction
+    which contradicts the voting.
+    """
+    # columns missing from the table are treated as not annotated
+    columns = {name: pc.fill_null(pc.utf8_trim_whitespace(table.column(name)), '')
+               if name in table.column_names else pa.chunked_array([pa.array([''] * table.num_rows)])
+               for name in ANNOTATION_COLUMNS}
+
+    label_major = encode_categories(columns['major_direction'], MAJOR_LABELS)
+    label_minor = encode_categories(columns['minor_direction'], MINOR_LABELS)
+    votes = parse_voting(columns['voting'])
+
+    is_unanimous = pc.equal(votes['num_dissents'], 0)
+    has_minor = pc.not_equal(columns['minor_direction'], '')
+    checks = [('major_direction', pc.is_null(label_major)),
+              ('minor_direction', pc.is_null(label_minor)),
+              ('voting', pc.is_null(votes['num_dissents'])),
+              ('minor_direction', pc.fill_null(pc.equal(is_unanimous, has_minor), False))]
+
+    errors = []
+    dates = columns['date'].to_pylist()
+    voting = columns['voting'].to_pylist()
+    for name, invalid in checks:
+        values = columns[name].to_pylist()
+        for idx in np.flatnonzero(np.asarray(invalid.to_pylist(), dtype=bool)):
+            errors.append(f'{dates[idx]}: {name}={values[idx]!r} (voting={voting[idx]!r})')
+    if errors:
+        raise LabelingError(errors)
+
+    labeled = pa.table(columns)
+    labeled = labeled.append_column('label_major', pc.cast(label_major, pa.int8()))
+    labeled = labeled.append_column('label_minor', pc.cast(label_minor, pa.int8()))
+    for name, counts in votes.items():
+        labeled = labeled.append_column(name, counts)
+
+    logger.info(f'Labeled {labeled.num_rows} rows')
+    return labeled
@@ -1,3 +1,4 @@
+import csv
 import re
 from glob import glob
 
@@ -5,12 +6,28 @@ import hanja
 from absl import app, flags, logging
 from tqdm import tqdm
 
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string('input_dir', default=None,
                     help='Path of input directory to preprocess')
 flags.DEFINE_string('output_path', default=None,
-                    help='Path of output file')
+                    help='Path of output file (.csv to annotate by hand, or a .parquet corpus store)')
+
+
+def normalize_text(text: str = None) -> str:
+    """Joins the lines, translates hanja and removes special characters and duplicate spaces."""
+    text = text.replace('\n', ' ')
+
+    # hanja translate
+    text = text.strip()
+    text = ''.join([hanja.translate(c, 'substitution') for c in text])
+
+    # remove special characters
+    text = re.sub(pattern='[^\w\s]', repl='', string=text)
+    text = re.sub(pattern='\s{1,}', repl=' ', string=text)
+    return text
 
 
 def main(argv):
@@ -18,28 +35,23 @@ def main(argv):
     file_list = sorted(file_list)
 
     logging.info(f'Preprocessing {len(file_list)} txt files to {FLAGS.output_path}')
-    with open(FLAGS.output_path, 'w') as output_file:
-        text_list = []
-        output_file.write('date, text, major_direction, voting, minor_direction \n')
-        for file in tqdm(file_list, desc='preprocessing'):
-            with open(file, 'r') as f:
-                date = file[-14:-4].replace('-', '')
-                text = f.read().replace('\n', ' ')
-
-                # hanja translate
-                text = text.strip()
-                text = ''.join([hanja.translate(c, 'substitution') for c in text])
-
-                # remove special characters
-                text = re.sub(pattern='[^\w\s]', repl='', string=text)
-                text = re.sub(pattern='\s{1,}', repl=' ', string=text)
-
-                text_list.append('"' + date + '", "' + text + '"')
-
-        # sort by date
-        sorted(text_list, key=lambda x: x[:9], reverse=True)
-        for text in tqdm(text_list, desc='writing output'):
-            output_file.write(text + ' \n')
+    records = []
+    for file in tqdm(file_list, desc='preprocessing'):
+        with open(file, 'r') as f:
+            date = file[-14:-4].replace('-', '')
+            records.append({'date': date, 'text': normalize_text(f.read())})
+
+    # sort by date
+    records = sorted(records, key=lambda x: x['date'])
+    if is_corpus_path(FLAGS.output_path):
+        CorpusStore(FLAGS.output_path).write(CorpusStore.from_records(records))
+        return
+
+    with open(FLAGS.output_path, 'w', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(['date', 'text', 'major_direction', 'voting', 'minor_direction'])
+        for record in tqdm(records, desc='writing output'):
+            writer.writerow([record['date'], record['text']])
 
 
 if __name__ == '__main__':
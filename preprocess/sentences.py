@@ -0,0 +1,32 @@
+import re
+from typing import List
+
+# the normalized decisions have no punctuation left, sentences end with the verb endings of the
+# written style (-다, -음, -함, -임, -됨) followed by a space (or a period in the raw text), except for 다음 (next)
+SENTENCE_END_PATTERN = re.compile(r'(?<=[다음함임됨])(?<!다음)\.?\s+')
+# the title every decision starts with (2001연 11월중 통화정책방향, or 통화정책방향 2001. 11. 8. in the raw text)
+HEADER_PATTERN = re.compile(r'^(?:\d{4}\s*[연년]\s*\d{1,2}\s*월중?\s*)?통화정책방향'
+                            r'(?:\s*\d{4}\s*\.\s*\d{1,2}\s*\.\s*\d{1,2}\s*\.)?\s*')
+
+
+def split_sentences(text: str = None,
+                    min_chars: int = 10) -> List[str]:
+    """
+    Splits a decision into sentences, pieces shorter than ``min_chars`` are joined to the previous one.
+    The title is a sentence of its own, so the first sentence of the body is cached like the others.
+    """
+    text = text.strip()
+    header = HEADER_PATTERN.match(text)
+    sentences = []
+    if header:
+        text = text[header.end():]
+    for piece in SENTENCE_END_PATTERN.split(text):
+        if not piece:
+            continue
+        if sentences and len(piece) < min_chars:
+            sentences[-1] = sentences[-1] + ' ' + piece
+        else:
+            sentences.append(piece)
+    if header:
+        sentences.insert(0, header.group().strip())
+    return sentences
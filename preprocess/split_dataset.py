@@ -3,14 +3,17 @@ Divides the dataset into training, development, and test split.
 """
 import random
 from pathlib import Path
+from typing import Set, Tuple
 
 from absl import app, flags, logging
 from tqdm import tqdm
 
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string('input_path', default=None,
-                    help='Path to the input data')
+                    help='Path to the input data (.jsonl or .parquet corpus store)')
 flags.DEFINE_string('save_dir', default=None,
                     help='Directory to save the splits')
 flags.DEFINE_bool('random', default=False,
@@ -23,22 +26,20 @@ flags.DEFINE_float('ratio_test', default=0.1,
 random.seed(42)
 
 
-def main(argv):
-    # Count number of data
-    num_data = 0
-    with open(FLAGS.input_path, 'r') as f:
-        for line in tqdm(f, desc='Counting data'):
-            num_data += 1
-
-    num_dev_data = int(num_data * FLAGS.ratio_dev)
-    num_test_data = int(num_data * FLAGS.ratio_test)
+def split_indices(num_data: int = None,
+                  ratio_dev: float = 0.1,
+                  ratio_test: float = 0.1,
+                  shuffle: bool = False) -> Tuple[Set[int], Set[int], Set[int]]:
+    """Returns the train, development and test indices of ``num_data`` samples."""
+    num_dev_data = int(num_data * ratio_dev)
+    num_test_data = int(num_data * ratio_test)
     num_train_data = num_data - num_dev_data - num_test_data
     logging.info(f'# training samples: {num_train_data}')
     logging.info(f'# development samples: {num_dev_data}')
     logging.info(f'# test samples: {num_test_data}')
 
     indices = list(range(num_data))
-    if FLAGS.random:
+    if shuffle:
         random.shuffle(indices)
 
     train_indices = set(indices[:num_train_data])
@@ -49,13 +50,37 @@ def main(argv):
     assert len(dev_indices) == num_dev_data
     assert len(test_indices) == num_test_data
 
+    return train_indices, dev_indices, test_indices
+
+
+def main(argv):
+    # Count number of data
+    num_data = 0
+    if is_corpus_path(FLAGS.input_path):
+        num_data = len(CorpusStore(FLAGS.input_path))
+    else:
+        with open(FLAGS.input_path, 'r') as f:
+            for line in tqdm(f, desc='Counting data'):
+                num_data += 1
+
+    train_indices, dev_indices, test_indices = split_indices(num_data,
+                                                             FLAGS.ratio_dev,
+                                                             FLAGS.ratio_test,
+                                                             FLAGS.random)
+
     save_dir = Path(FLAGS.save_dir)
     save_dir.mkdir()
-    train_file = open(save_dir / 'train.jsonl', 'w')
-    dev_file = open(save_dir / 'dev.jsonl', 'w')
-    test_file = open(save_dir / 'test.jsonl', 'w')
 
-    with open(FLAGS.input_path, 'r') as f:
+    if is_corpus_path(FLAGS.input_path):
+        table = CorpusStore(FLAGS.input_path).read()
+        for name, indices in [('train', train_indices), ('dev', dev_indices), ('test', test_indices)]:
+            CorpusStore(save_dir / f'{name}.parquet').write(table.take(sorted(indices)))
+        return
+
+    with open(save_dir / 'train.jsonl', 'w') as train_file, \
+            open(save_dir / 'dev.jsonl', 'w') as dev_file, \
+            open(save_dir / 'test.jsonl', 'w') as test_file, \
+            open(FLAGS.input_path, 'r') as f:
         for line_num, line in tqdm(enumerate(f), desc='Splitting dataset'):
             if line_num in train_indices:
                 file_to_write = train_file
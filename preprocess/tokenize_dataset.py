@@ -0,0 +1,38 @@
+"""
+Caches the token ids of a corpus store so the dataset reader can load them without re-tokenizing.
+"""
+import json
+
+from absl import app, flags, logging
+
+from preprocess.corpus_store import CorpusStore, add_token_ids
+from preprocess.tokenization_kbalbert import KbAlbertCharTokenizer
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('input_path', default=None,
+                    help='Path of the input .parquet corpus store')
+flags.DEFINE_string('output_path', default=None,
+                    help='Path of the output .parquet corpus store, defaults to the input path')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length to truncate and pad the token ids to')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+
+    logging.info(f'Tokenizing {FLAGS.input_path}')
+    table = add_token_ids(CorpusStore(FLAGS.input_path).read(), tokenizer, FLAGS.max_length)
+    CorpusStore(FLAGS.output_path or FLAGS.input_path).write(table)
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required(['input_path', 'tokenizer_config_path', 'vocab_path'])
+    app.run(main)
@@ -0,0 +1,104 @@
+"""
+Continued masked language model pretraining of KB-ALBERT on the decision texts.
+The saved directory is used as --model_path (and its config.json as --model_config_path) of train.py.
+"""
+import json
+
+from absl import app, flags, logging
+from pytorch_lightning import Trainer, seed_everything
+from pytorch_lightning.callbacks import LearningRateLogger
+from pytorch_lightning.loggers import TensorBoardLogger
+
+from preprocess import KbAlbertCharTokenizer
+from models.kbalbert_mlm_model import KbAlbertMaskedLmModel
+from callbacks import PretrainedCheckpoint
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list('train_paths', default=None,
+                  help='Comma separated paths to the texts to pretrain on (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Pretrained model path')
+flags.DEFINE_string('model_config_path', default=None,
+                    help='Pretrained model config path')
+flags.DEFINE_string('save_dir', default=None,
+                    help='Path to save the pretrained model')
+flags.DEFINE_string('version', default=None,
+                    help='Explain experiment version')
+flags.DEFINE_integer('cuda_device', default=0,
+                     help='If given, uses this CUDA device in training')
+flags.DEFINE_integer('max_epochs', default=3,
+                     help='If given, uses this number of passes over the texts')
+flags.DEFINE_integer('max_steps', default=None,
+                     help='If given, stops after this number of steps')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the packed sequences')
+flags.DEFINE_float('mlm_probability', default=0.15,
+                   help='Ratio of the tokens to mask')
+flags.DEFINE_integer('batch_size', default=4,
+                     help='If given, uses this batch size in training')
+flags.DEFINE_integer('num_workers', default=0,
+                     help='If given, uses this number of workers in data loading')
+flags.DEFINE_float('lr', default=5e-5,
+                   help='If given, uses this learning rate in training')
+flags.DEFINE_float('weight_decay', default=0.01,
+                   help='If given, uses this weight decay in training')
+flags.DEFINE_integer('warm_up', default=100,
+                     help='If given, uses this warm up in training')
+flags.DEFINE_integer('checkpoint_every', default=500,
+                     help='Saves the pretrained model every this number of steps')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+
+    seed_everything(42)
+
+    model = KbAlbertMaskedLmModel(train_paths=FLAGS.train_paths,
+                                  model_path=FLAGS.model_path,
+                                  config_path=FLAGS.model_config_path,
+                                  tokenizer=tokenizer,
+                                  tokenizer_config=tokenizer_config,
+                                  max_length=FLAGS.max_length,
+                                  mlm_probability=FLAGS.mlm_probability,
+                                  batch_size=FLAGS.batch_size,
+                                  num_workers=FLAGS.num_workers,
+                                  lr=FLAGS.lr,
+                                  weight_decay=FLAGS.weight_decay,
+                                  warm_up=FLAGS.warm_up)
+
+    logger = TensorBoardLogger(
+        save_dir=FLAGS.save_dir,
+        name='logs_pretrain',
+        version=FLAGS.version
+    )
+    lr_logger = LearningRateLogger()
+    pretrained_checkpoint = PretrainedCheckpoint(save_dir=FLAGS.save_dir,
+                                                 every_n_steps=FLAGS.checkpoint_every)
+
+    trainer = Trainer(deterministic=True,
+                      gpus=FLAGS.cuda_device,
+                      checkpoint_callback=False,
+                      max_epochs=FLAGS.max_epochs,
+                      max_steps=FLAGS.max_steps,
+                      logger=logger,
+                      callbacks=[lr_logger, pretrained_checkpoint])
+    trainer.fit(model)
+
+    model.save_pretrained(FLAGS.save_dir)
+    logging.info(f'Use --model_path {FLAGS.save_dir} --model_config_path {FLAGS.save_dir}/config.json in train.py')
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required([
+        'train_paths', 'tokenizer_config_path', 'vocab_path', 'model_path', 'model_config_path', 'save_dir', 'version'
+    ])
+    app.run(main)
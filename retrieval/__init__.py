@@ -0,0 +1,4 @@
+from retrieval.embedding_index import EmbeddingIndex, embed_texts, read_decisions
+
+
+__all__ = ['EmbeddingIndex', 'embed_texts', 'read_decisions']
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from transformers import AlbertModel, AlbertTokenizer
+
+from preprocess.corpus_store import CorpusStore, is_corpus_path
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'index.json'
+VECTORS_FILE = 'vectors.f16'
+KEYS_FILE = 'keys.jsonl'
+IVF_FILE = 'ivf.npz'
+
+KEY_COLUMNS = ['date', 'major_direction', 'voting', 'minor_direction']
+
+
+def read_decisions(file_path: str = None) -> List[Dict]:
+    """Reads the date, text and (if annotated) the decision columns of a .jsonl file or a .parquet corpus store."""
+    if is_corpus_path(file_path):
+        store = CorpusStore(file_path)
+        columns = [name for name in ['text'] + KEY_COLUMNS if name in store.schema.names]
+        records = store.read(columns=columns).to_pylist()
+        for record in records:
+            record['date'] = record['date'].strftime('%Y%m%d')
+        return records
+
+    with open(file_path) as dataset_file:
+        return [json.loads(line) for line in dataset_file]
+
+
+def embed_texts(text_embedding: AlbertModel = None,
+                tokenizer: AlbertTokenizer = None,
+                texts: List[str] = None,
+                max_length: int = 512,
+                batch_size: int = 16) -> np.ndarray:
+    """Returns the pooler output of ``text_embedding`` for every text as a float32 matrix."""
+    text_embedding.eval()
+    vectors = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            encoded = tokenizer(texts[start:start + batch_size],
+                                add_special_tokens=True,
+                                max_length=max_length,
+                                truncation=True,
+                                padding='max_length',
+                                return_attention_mask=True,
+                                return_tensors='pt')
+            text_embedded = text_embedding(encoded['input_ids'],
+                                           token_type_ids=None,
+                                           attention_mask=encoded['attention_mask'])
+            vectors.append(text_embedded[1].float().numpy())
+    return np.concatenate(vectors) if vectors else np.zeros((0, text_embedding.config.hidden_size), np.float32)
+
+
+def normalize(vectors: np.ndarray = None) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray = None,
+          k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise indices and values of the ``k`` largest scores, sorted descending."""
+    k = min(k, scores.shape[1])
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class EmbeddingIndex:
+    """
+    Cosine similarity index over decision embeddings stored in ``index_dir``. The unit normalized vectors are
+    kept as a float16 matrix appended to ``vectors.f16`` (memory mapped on load) and their keys, one JSON
+    object per decision, in ``keys.jsonl``, so new decisions are added without touching the archive.
+
+    Queries are scored against the whole matrix in batched matrix products. For larger corpora ``build_ivf``
+    adds an inverted file: k-means lists over the vectors with int8 codes, which are scanned for the
+    ``num_probes`` closest lists only and reranked with the float16 vectors.
+    """
+    def __init__(self,
+                 index_dir: str = None,
+                 dim: int = None) -> None:
+        self.index_dir = index_dir
+        meta_path = os.path.join(index_dir, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)['dim']
+        else:
+            if dim is None:
+                raise ValueError(f'No index at {index_dir}, give the vector dimension to create one')
+            os.makedirs(index_dir, exist_ok=True)
+            self.dim = dim
+            with open(meta_path, 'w') as f:
+                json.dump({'dim': dim, 'dtype': 'float16'}, f)
+            open(os.path.join(index_dir, VECTORS_FILE), 'wb').close()
+            open(os.path.join(index_dir, KEYS_FILE), 'w').close()
+
+        with open(os.path.join(index_dir, KEYS_FILE)) as f:
+            self.keys = [json.loads(line) for line in f]
+        self.vectors = self._load_vectors()
+        self.ivf = self._load_ivf()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _load_vectors(self) -> np.ndarray:
+        path = os.path.join(self.index_dir, VECTORS_FILE)
+        if os.path.getsize(path) == 0:
+            return np.zeros((0, self.dim), dtype=np.float16)
+        return np.memmap(path, dtype=np.float16, mode='r', shape=(len(self.keys), self.dim))
+
+    def _load_ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        path = os.path.join(self.index_dir, IVF_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as ivf:
+            return {name: ivf[name] for name in ivf.files}
+
+    def add(self,
+            keys: List[Dict] = None,
+            vectors: np.ndarray = None) -> None:
+        """Appends the vectors and their keys, assigning them to the inverted lists if there are any."""
+        if len(keys) != len(vectors):
+            raise ValueError(f'{len(keys)} keys for {len(vectors)} vectors')
+        vectors = normalize(vectors)
+        with open(os.path.join(self.index_dir, VECTORS_FILE), 'ab') as f:
+            f.write(vectors.astype(np.float16).tobytes())
+        with open(os.path.join(self.index_dir, KEYS_FILE), 'a') as f:
+            for key in keys:
+                f.write(json.dumps(key, ensure_ascii=False) + '\n')
+
+        if self.ivf is not None:
+            codes, scales = self._quantize(vectors)
+            self.ivf['assignments'] = np.concatenate([self.ivf['assignments'], self._assign(vectors)])
+            self.ivf['codes'] = np.concatenate([self.ivf['codes'], codes])
+            self.ivf['scales'] = np.concatenate([self.ivf['scales'], scales])
+            np.savez(os.path.join(self.index_dir, IVF_FILE), **self.ivf)
+
+        self.keys.extend(keys)
+        self.vectors = self._load_vectors()
+        logger.info(f'Added {len(keys)} vectors, {len(self)} in the index')
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _assign(self,
+                vectors: np.ndarray = None) -> np.ndarray:
+        return np.argmax(vectors @ self.ivf['centroids'].T, axis=1).astype(np.int32)
+
+    def build_ivf(self,
+                  num_lists: int = 16,
+                  num_iterations: int = 20,
+                  seed: int = 42) -> None:
+        """
+        Clusters the vectors into ``num_lists`` inverted lists (spherical k-means, at most one list per vector)
+        and stores int8 codes.
+        """
+        if len(self) == 0:
+            raise ValueError(f'The index at {self.index_dir} is empty, add vectors before building inverted lists')
+        if num_lists < 1:
+            raise ValueError(f'num_lists must be positive, got {num_lists}')
+        if num_lists > len(self):
+            logger.warning(f'{num_lists} inverted lists for {len(self)} vectors, building {len(self)}')
+            num_lists = len(self)
+
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        rng = np.random.RandomState(seed)
+        centroids = vectors[rng.choice(len(vectors), num_lists, replace=False)]
+        for _ in range(num_iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for list_idx in range(num_lists):
+                members = vectors[assignments == list_idx]
+                if len(members):
+                    centroids[list_idx] = members.mean(axis=0)
+            centroids = normalize(centroids)
+
+        self.ivf = {'centroids': centroids}
+        codes, scales = self._quantize(vectors)
+        self.ivf.update({'assignments': self._assign(vectors), 'codes': codes, 'scales': scales})
+        np.savez(os.path.join(self.index_dir, IVF_FILE), **self.ivf)
+        logger.info(f'Built {num_lists} inverted lists over {len(vectors)} vectors')
+
+    def search(self,
+               queries: np.ndarray = None,
+               k: int = 10,
+               batch_size: int = 1024,
+               num_probes: int = None,
+               num_rerank: int = 100) -> List[List[Tuple[float, Dict]]]:
+        """
+        Returns the ``k`` most cosine similar (score, key) pairs for every query. With ``num_probes``
+        (and an inverted file built) only the vectors of the closest lists are scored, first with
+        their int8 codes, then the best ``num_rerank`` of them with the float16 vectors.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            if num_probes and self.ivf is not None:
+                results.extend(self._search_ivf(query, k, num_probes, num_rerank) for query in batch)
+            else:
+                results.extend(self._search_exact(batch, k))
+        return results
+
+    def _search_exact(self,
+                      queries: np.ndarray = None,
+                      k: int = 10,
+                      chunk_size: int = 65536) -> List[List[Tuple[float, Dict]]]:
+        best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        # scan the (memory mapped) matrix in chunks, keeping the running top k
+        for start in range(0, len(self), chunk_size):
+            chunk = np.asarray(self.vectors[start:start + chunk_size], dtype=np.float32)
+            scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+            indices = np.concatenate([best_indices, np.broadcast_to(np.arange(start, start + len(chunk)),
+                                                                    (len(queries), len(chunk)))], axis=1)
+            positions, best_scores = top_k(scores, k)
+            best_indices = np.take_along_axis(indices, positions, axis=1)
+        return [[(float(score), self.keys[idx]) for score, idx in zip(scores, indices)]
+                for scores, indices in zip(best_scores, best_indices)]
+
+    def _search_ivf(self,
+                    query: np.ndarray = None,
+                    k: int = 10,
+                    num_probes: int = 4,
+                    num_rerank: int = 100) -> List[Tuple[float, Dict]]:
+        lists = np.argsort(-(self.ivf['centroids'] @ query))[:num_probes]
+        candidates = np.flatnonzero(np.isin(self.ivf['assignments'], lists))
+        if len(candidates) == 0:
+            return []
+        approximate = (self.ivf['codes'][candidates].astype(np.float32) @ query) * self.ivf['scales'][candidates]
+        # rerank the best approximate candidates in index order, which keeps the memory mapped reads sequential
+        candidates = np.sort(candidates[top_k(approximate[None, :], num_rerank)[0][0]])
+
+        scores = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        positions, values = top_k(scores[None, :], k)
+        return [(float(score), self.keys[idx]) for score, idx in zip(values[0], candidates[positions[0]])]
@@ -0,0 +1,66 @@
+"""
+Finds the past decisions reading most like the given ones in the embedding index built by build_index.py
+and writes them as JSON lines: the date of every query decision with its nearest neighbors and their scores.
+"""
+import json
+
+from absl import app, flags, logging
+from transformers import AlbertModel
+
+from preprocess import KbAlbertCharTokenizer
+from retrieval import EmbeddingIndex, embed_texts, read_decisions
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('query_path', default=None,
+                    help='Path to the decisions to look up (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('index_dir', default=None,
+                    help='Directory of the embedding index')
+flags.DEFINE_string('output_path', default=None,
+                    help='Path to write the neighbors as JSON lines')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Trained text embedding path, the one the index was built with')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('batch_size', default=16,
+                     help='Number of decisions embedded at once')
+flags.DEFINE_integer('top_k', default=5,
+                     help='Number of neighbors per decision')
+flags.DEFINE_integer('num_probes', default=None,
+                     help='If given, searches this number of inverted lists instead of the whole index')
+flags.DEFINE_bool('exclude_self', default=True,
+                  help='Leaves out the neighbor with the same date as the query decision')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+    text_embedding = AlbertModel.from_pretrained(FLAGS.model_path)
+    index = EmbeddingIndex(FLAGS.index_dir)
+
+    records = read_decisions(FLAGS.query_path)
+    vectors = embed_texts(text_embedding, tokenizer, [record['text'] for record in records],
+                          FLAGS.max_length, FLAGS.batch_size)
+    results = index.search(vectors, k=FLAGS.top_k + int(FLAGS.exclude_self), num_probes=FLAGS.num_probes)
+
+    with open(FLAGS.output_path, 'w', encoding='utf-8') as f:
+        for record, neighbors in zip(records, results):
+            if FLAGS.exclude_self:
+                neighbors = [(score, key) for score, key in neighbors if key['date'] != record['date']]
+            neighbors = [dict(key, score=score) for score, key in neighbors[:FLAGS.top_k]]
+            f.write(json.dumps({'date': record['date'], 'neighbors': neighbors}, ensure_ascii=False) + '\n')
+    logging.info(f'Wrote the neighbors of {len(records)} decisions to {FLAGS.output_path}')
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required([
+        'query_path', 'index_dir', 'output_path', 'tokenizer_config_path', 'vocab_path', 'model_path'
+    ])
+    app.run(main)
@@ -0,0 +1,185 @@
+"""
+Sweeps the inference options of a trained KbAlbertClassificationModel on the dev split: the number of ALBERT
+layer repetitions run, the early exit confidence threshold and the number of pruned attention heads (the least
+important first, ranked by the dev loss increase of masking each head). Reports the latency/accuracy frontier
+and saves the fastest configuration within --max_accuracy_drop of the full model next to the checkpoint.
+"""
+import copy
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+import torch
+from absl import app, flags, logging
+from torch.nn import CrossEntropyLoss
+
+from preprocess import KbAlbertCharTokenizer
+from models import KbAlbertClassificationModel
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('checkpoint_path', default=None,
+                    help='Checkpoint saved by train.py (major or minor model)')
+flags.DEFINE_string('dev_path', default=None,
+                    help='Path to the dev dataset (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('label_type', default=None,
+                    help='Label type of the checkpoint (major or minor)')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Pretrained model path')
+flags.DEFINE_string('model_config_path', default=None,
+                    help='Pretrained model config path')
+flags.DEFINE_integer('max_length', default=512,
+                     help='Length of the token ids')
+flags.DEFINE_integer('batch_size', default=4,
+                     help='Batch size of the dev evaluation')
+flags.DEFINE_list('num_layers', default=[],
+                  help='Numbers of layer repetitions to try, defaults to all from 1 to num_hidden_layers')
+flags.DEFINE_list('exit_thresholds', default=['none', '0.9', '0.99'],
+                  help='Early exit confidence thresholds to try, none disables early exit')
+flags.DEFINE_list('prune_counts', default=['0', '2', '4'],
+                  help='Numbers of attention heads to prune to try')
+flags.DEFINE_float('max_accuracy_drop', default=0.01,
+                   help='Largest dev accuracy drop from the full model allowed for the saved configuration')
+flags.DEFINE_string('report_path', default=None,
+                    help='If given, writes every measured configuration as JSON')
+flags.DEFINE_string('inference_config_path', default=None,
+                    help='Path of the chosen configuration, defaults to [CHECKPOINT]-inference.json')
+
+
+def evaluate(model: KbAlbertClassificationModel = None) -> Dict[str, float]:
+    """Dev accuracy, loss and milliseconds per document (after one untimed warm up batch)."""
+    model.eval()
+    batches = list(model.val_dataloader())
+    labels_name = 'label_major' if model.num_classes == 3 else 'label_minor'
+    loss_fct = CrossEntropyLoss(reduction='sum')
+    num_correct, loss, seconds = 0, 0., 0.
+    with torch.no_grad():
+        model(batches[0])
+        for batch in batches:
+            start = time.perf_counter()
+            logits = model(batch)
+            seconds += time.perf_counter() - start
+            labels = batch[labels_name].view(-1)
+            num_correct += int((logits.argmax(dim=-1) == labels).sum())
+            loss += float(loss_fct(logits, labels))
+    num_docs = sum(len(batch['input_ids']) for batch in batches)
+    return {'dev_acc': num_correct / num_docs,
+            'dev_loss': loss / num_docs,
+            'latency_ms': 1000. * seconds / num_docs}
+
+
+def rank_heads(model: KbAlbertClassificationModel = None,
+               base_loss: float = None) -> List[Tuple[int, int]]:
+    """(layer, head) pairs of the shared layers ordered by the dev loss increase of masking them, least first."""
+    config = model.text_embedding.config
+    num_layers = config.num_hidden_groups * config.inner_group_num
+    importance = []
+    for layer in range(num_layers):
+        for head in range(config.num_attention_heads):
+            model.head_mask = torch.ones(num_layers, config.num_attention_heads)
+            model.head_mask[layer, head] = 0.
+            importance.append((evaluate(model)['dev_loss'] - base_loss, layer, head))
+    model.head_mask = None
+    return [(layer, head) for _, layer, head in sorted(importance)]
+
+
+def frontier(results: List[Dict] = None) -> List[Dict]:
+    """Configurations no other one beats in both latency and accuracy, fastest first."""
+    points = []
+    for result in sorted(results, key=lambda x: (x['latency_ms'], -x['dev_acc'])):
+        if not points or result['dev_acc'] > points[-1]['dev_acc']:
+            points.append(result)
+    return points
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+
+    if FLAGS.label_type == 'major':
+        num_classes = 3
+    elif FLAGS.label_type == 'minor':
+        num_classes = 4
+    else:
+        raise ValueError('Unknown model type')
+
+    # only the dev split is evaluated
+    model = KbAlbertClassificationModel(dev_path=FLAGS.dev_path,
+                                        model_path=FLAGS.model_path,
+                                        config_path=FLAGS.model_config_path,
+                                        tokenizer=tokenizer,
+                                        num_classes=num_classes,
+                                        batch_size=FLAGS.batch_size,
+                                        max_length=FLAGS.max_length)
+    model.load_state_dict(torch.load(FLAGS.checkpoint_path, map_location='cpu')['state_dict'])
+
+    base = evaluate(model)
+    logging.info(f'Full model: acc {base["dev_acc"]:.4f}, {base["latency_ms"]:.2f} ms/doc')
+    ranked_heads = rank_heads(model, base['dev_loss'])
+
+    config = model.text_embedding.config
+    layer_counts = [int(count) for count in FLAGS.num_layers] or list(range(1, config.num_hidden_layers + 1))
+    thresholds = [None if threshold == 'none' else float(threshold) for threshold in FLAGS.exit_thresholds]
+    results = []
+    for prune_count in [int(count) for count in FLAGS.prune_counts]:
+        pruned_heads = {}
+        for layer, head in ranked_heads[:prune_count]:
+            pruned_heads.setdefault(layer, []).append(head)
+        if any(len(heads) >= config.num_attention_heads for heads in pruned_heads.values()):
+            logging.info(f'Skipping {prune_count} pruned heads, a layer would have no head left')
+            continue
+        pruned_model = copy.deepcopy(model)
+        pruned_model.configure_inference(pruned_heads=pruned_heads)
+        for num_layers in layer_counts:
+            for exit_threshold in thresholds:
+                pruned_model.reset_inference()
+                pruned_model.configure_inference(num_layers=num_layers, exit_threshold=exit_threshold)
+                result = dict(pruned_model.inference_config(), **evaluate(pruned_model))
+                logging.info(f'{num_layers:>3} layers, exit {str(exit_threshold):>5}, {prune_count:>3} pruned heads: '
+                             f'acc {result["dev_acc"]:.4f}, {result["latency_ms"]:.2f} ms/doc')
+                results.append(result)
+
+    points = frontier(results)
+    logging.info('Latency/accuracy frontier:')
+    for point in points:
+        logging.info(f'  {point["latency_ms"]:8.2f} ms/doc  acc {point["dev_acc"]:.4f}  '
+                     f'layers {point["num_layers"]}, exit {point["exit_threshold"]}, pruned {point["pruned_heads"]}')
+
+    if FLAGS.report_path:
+        with open(FLAGS.report_path, 'w') as f:
+            json.dump({'full_model': base, 'results': results, 'frontier': points}, f, indent=2)
+
+    eligible = [point for point in points if point['dev_acc'] >= base['dev_acc'] - FLAGS.max_accuracy_drop]
+    if not eligible:
+        logging.info(f'No configuration within {FLAGS.max_accuracy_drop} of the full model accuracy, nothing saved')
+        return
+    chosen = eligible[0]
+
+    inference_config_path = FLAGS.inference_config_path or \
+        os.path.splitext(FLAGS.checkpoint_path)[0] + '-inference.json'
+    model.configure_inference(num_layers=chosen['num_layers'],
+                              exit_threshold=chosen['exit_threshold'],
+                              pruned_heads=chosen['pruned_heads'])
+    model.save_inference_config(inference_config_path,
+                                dev_acc=chosen['dev_acc'],
+                                dev_loss=chosen['dev_loss'],
+                                latency_ms=chosen['latency_ms'],
+                                full_model_dev_acc=base['dev_acc'],
+                                full_model_latency_ms=base['latency_ms'])
+    logging.info(f'Saved the configuration to {inference_config_path}, '
+                 f'apply it with model.load_inference_config after loading the checkpoint')
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required([
+        'checkpoint_path', 'dev_path', 'label_type', 'vocab_path', 'model_path', 'model_config_path'
+    ])
+    app.run(main)
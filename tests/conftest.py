@@ -0,0 +1,74 @@
+"""
+Small synthetic labeled corpus shared by the tests, so they need neither the real dataset nor the benchmarks.
+"""
+import datetime
+import json
+import os
+import random
+from typing import Dict, List
+
+import pyarrow as pa
+import pytest
+
+from preprocess.corpus_store import CorpusStore
+from preprocess.labeling import annotations_to_table, label_table, ANNOTATION_COLUMNS
+
+NUM_DOCUMENTS = 30
+
+SENTENCES = ['국내경제는 수출이 완만한 회복 흐름을 지속하였다.',
+             '소비자물가 상승률은 국제유가 하락 등으로 1%대 초반을 나타내었다.',
+             '금융시장은 주요국 통화정책 기대 변화 등에 힘입어 안정된 모습을 보였다.',
+             '가계대출은 증가규모가 전월에 비해 축소되었으며 주택가격은 하락하였다.',
+             '금융통화위원회는 금융안정에 유의하여 통화정책을 운용해 나갈 것이다.']
+
+
+def make_records(num_documents: int = NUM_DOCUMENTS,
+                 seed: int = 42) -> List[Dict[str, str]]:
+    """Annotated records (the columns of the annotation csv) with random decisions and texts."""
+    rng = random.Random(seed)
+    date = datetime.date(2010, 1, 14)
+    records = []
+    for _ in range(num_documents):
+        major_direction = rng.choice(['fall', 'freeze', 'rise'])
+        voting = rng.choice(['unanimous', '6-1', '5-2'])
+        minor_direction = '' if voting == 'unanimous' else \
+            rng.choice([direction for direction in ['fall', 'freeze', 'rise'] if direction != major_direction])
+        text = '통화정책방향 ' + ' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 5)))
+        records.append({'date': date.strftime('%Y%m%d'),
+                        'text': text,
+                        'major_direction': major_direction,
+                        'voting': voting,
+                        'minor_direction': minor_direction})
+        date += datetime.timedelta(days=30)
+    return records
+
+
+def write_vocab(texts: List[str] = None,
+                vocab_path: str = None) -> str:
+    """Character vocabulary in the ``KbAlbertCharTokenizer`` format covering the given texts."""
+    chars = sorted({char for text in texts for char in text if not char.isspace()})
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        for token in ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars + ['##' + char for char in chars]:
+            f.write(token + '\n')
+    return vocab_path
+
+
+@pytest.fixture(scope='session')
+def labeled_table() -> pa.Table:
+    records = make_records()
+    return label_table(annotations_to_table([[record[name] for name in ANNOTATION_COLUMNS] for record in records]))
+
+
+@pytest.fixture(scope='session')
+def corpus_paths(tmp_path_factory, labeled_table) -> Dict[str, str]:
+    """The labeled corpus as a .jsonl file and as a .parquet corpus store, with its vocabulary."""
+    work_dir = str(tmp_path_factory.mktemp('corpus'))
+    jsonl_path = os.path.join(work_dir, 'labeled_dataset.jsonl')
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for record in labeled_table.to_pylist():
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    store = CorpusStore(os.path.join(work_dir, 'labeled_dataset.parquet'))
+    store.write(labeled_table)
+    return {'jsonl_path': jsonl_path,
+            'parquet_path': store.path,
+            'vocab_path': write_vocab(labeled_table.column('text').to_pylist(), os.path.join(work_dir, 'vocab.txt'))}
@@ -0,0 +1,121 @@
+"""
+Training interrupted at a full state checkpoint and resumed must end with the same weights and run the same
+validations as training straight through.
+
+python -m pytest tests
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip('pytorch_lightning')
+pytest.importorskip('transformers')
+
+import torch
+from pytorch_lightning import Callback, Trainer, seed_everything
+from pytorch_lightning.callbacks import ModelCheckpoint, EarlyStopping
+from transformers import AlbertConfig, AlbertModel
+
+from callbacks import FullStateCheckpoint
+from models import KbAlbertClassificationModel
+from preprocess import KbAlbertCharTokenizer
+from preprocess.corpus_store import CorpusStore
+
+# the last batch of an epoch is a partial one
+NUM_DOCUMENTS = 30
+BATCH_SIZE = 4
+BATCHES_PER_EPOCH = 8
+MAX_EPOCHS = 3
+MAX_LENGTH = 64
+
+
+class ValidationRecorder(Callback):
+    def __init__(self) -> None:
+        self.validations = []
+
+    def on_validation_end(self, trainer, pl_module) -> None:
+        if not trainer.running_sanity_check:
+            self.validations.append((trainer.current_epoch,
+                                     trainer.global_step,
+                                     float(trainer.callback_metrics['val_loss'])))
+
+
+@pytest.fixture(scope='module')
+def paths(tmp_path_factory, corpus_paths):
+    assert len(CorpusStore(corpus_paths['parquet_path'])) == NUM_DOCUMENTS
+    work_dir = str(tmp_path_factory.mktemp('resume'))
+    model_dir = os.path.join(work_dir, 'model')
+    tokenizer = KbAlbertCharTokenizer(vocab_file=corpus_paths['vocab_path'])
+    config_dict = {'vocab_size': tokenizer.vocab_size,
+                   'embedding_size': 32,
+                   'hidden_size': 64,
+                   'num_hidden_layers': 2,
+                   'num_hidden_groups': 1,
+                   'num_attention_heads': 2,
+                   'intermediate_size': 128,
+                   'max_position_embeddings': MAX_LENGTH,
+                   'type_vocab_size': 2}
+    torch.manual_seed(0)
+    AlbertModel(AlbertConfig(**config_dict)).save_pretrained(model_dir)
+    config_path = os.path.join(model_dir, 'tiny_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config_dict, f)
+    return {'work_dir': work_dir,
+            'train_path': corpus_paths['parquet_path'],
+            'vocab_path': corpus_paths['vocab_path'],
+            'model_path': model_dir,
+            'config_path': config_path}
+
+
+def train(paths, save_dir, full_state_path, every_n_steps, max_steps=None, resume_path=None):
+    """Trains like train.py does and returns the final weights and the validations run."""
+    seed_everything(42)
+    model = KbAlbertClassificationModel(train_path=paths['train_path'],
+                                        dev_path=paths['train_path'],
+                                        model_path=paths['model_path'],
+                                        config_path=paths['config_path'],
+                                        tokenizer=KbAlbertCharTokenizer(vocab_file=paths['vocab_path']),
+                                        num_classes=3,
+                                        batch_size=BATCH_SIZE,
+                                        warm_up=4,
+                                        max_length=MAX_LENGTH)
+    recorder = ValidationRecorder()
+    trainer = Trainer(deterministic=True,
+                      checkpoint_callback=ModelCheckpoint(filepath=os.path.join(save_dir, 'model'),
+                                                          save_top_k=1,
+                                                          monitor='val_loss',
+                                                          mode='min'),
+                      early_stop_callback=EarlyStopping(monitor='val_loss', patience=2, strict=False, mode='min'),
+                      max_epochs=MAX_EPOCHS,
+                      max_steps=max_steps,
+                      logger=False,
+                      weights_summary=None,
+                      progress_bar_refresh_rate=0,
+                      resume_from_checkpoint=resume_path,
+                      callbacks=[recorder, FullStateCheckpoint(path=full_state_path,
+                                                               every_n_steps=every_n_steps,
+                                                               resume_path=resume_path)])
+    trainer.fit(model)
+    return model.state_dict(), recorder.validations
+
+
+@pytest.mark.parametrize('interrupt_step', [5, BATCHES_PER_EPOCH, BATCHES_PER_EPOCH + 3])
+def test_resume_is_identical(paths, interrupt_step):
+    work_dir = os.path.join(paths['work_dir'], f'step-{interrupt_step}')
+
+    straight_weights, straight_validations = train(paths, os.path.join(work_dir, 'straight'),
+                                                   os.path.join(work_dir, 'straight-full_state.ckpt'),
+                                                   every_n_steps=interrupt_step)
+
+    full_state_path = os.path.join(work_dir, 'interrupted-full_state.ckpt')
+    _, interrupted_validations = train(paths, os.path.join(work_dir, 'interrupted'), full_state_path,
+                                       every_n_steps=interrupt_step, max_steps=interrupt_step)
+    resumed_weights, resumed_validations = train(paths, os.path.join(work_dir, 'interrupted'), full_state_path,
+                                                 every_n_steps=interrupt_step, resume_path=full_state_path)
+
+    assert len(straight_validations) == MAX_EPOCHS
+    assert interrupted_validations + resumed_validations == straight_validations
+    assert straight_weights.keys() == resumed_weights.keys()
+    for name, tensor in straight_weights.items():
+        assert torch.equal(tensor, resumed_weights[name]), name
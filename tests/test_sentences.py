@@ -0,0 +1,24 @@
+"""
+The title of a decision is split out as a sentence of its own.
+
+python -m pytest tests
+"""
+from preprocess.sentences import split_sentences
+
+
+def test_normalized_title_is_own_sentence():
+    text = '2001연 11월중 통화정책방향 실물경제는 내수를 중심으로 다소 호전되는 모습을 보였음 소비자물가는 안정되었음'
+    assert split_sentences(text) == ['2001연 11월중 통화정책방향',
+                                     '실물경제는 내수를 중심으로 다소 호전되는 모습을 보였음',
+                                     '소비자물가는 안정되었음']
+
+
+def test_raw_title_is_own_sentence():
+    text = '통화정책방향\n2001. 11. 8.\n금융통화위원회는 다음 통화정책방향 결정시까지 기준금리를 유지하기로 하였다.'
+    assert split_sentences(text) == ['통화정책방향\n2001. 11. 8.',
+                                     '금융통화위원회는 다음 통화정책방향 결정시까지 기준금리를 유지하기로 하였다.']
+
+
+def test_short_first_sentence_is_not_joined_to_title():
+    assert split_sentences('통화정책방향 물가는 안정됨 국내경제는 회복세를 지속하였다') == \
+        ['통화정책방향', '물가는 안정됨', '국내경제는 회복세를 지속하였다']
@@ -0,0 +1,46 @@
+"""
+Runs the split step of the pipeline end to end on both input formats.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from preprocess.corpus_store import CorpusStore
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPLIT_COLUMNS = ['date', 'label_major', 'label_minor']
+
+
+def run_split(input_path, save_dir):
+    subprocess.run([sys.executable, '-m', 'preprocess.split_dataset',
+                    '--input_path', input_path,
+                    '--save_dir', save_dir,
+                    '--random'],
+                   cwd=REPO_DIR, check=True)
+
+
+def test_split_jsonl(tmp_path, corpus_paths):
+    save_dir = str(tmp_path / 'splits')
+    run_split(corpus_paths['jsonl_path'], save_dir)
+
+    with open(corpus_paths['jsonl_path'], encoding='utf-8') as f:
+        lines = f.readlines()
+    splits = {}
+    for name in ['train', 'dev', 'test']:
+        with open(os.path.join(save_dir, f'{name}.jsonl'), encoding='utf-8') as f:
+            splits[name] = f.readlines()
+    assert [len(splits[name]) for name in ['train', 'dev', 'test']] == [24, 3, 3]
+    assert sorted(sum(splits.values(), [])) == sorted(lines)
+    assert all('label_major' in json.loads(line) for line in splits['dev'])
+
+
+def test_split_parquet(tmp_path, corpus_paths):
+    save_dir = str(tmp_path / 'splits')
+    run_split(corpus_paths['parquet_path'], save_dir)
+
+    splits = {name: CorpusStore(os.path.join(save_dir, f'{name}.parquet')).read(columns=SPLIT_COLUMNS).to_pylist()
+              for name in ['train', 'dev', 'test']}
+    assert [len(splits[name]) for name in ['train', 'dev', 'test']] == [24, 3, 3]
+    whole = CorpusStore(corpus_paths['parquet_path']).read(columns=SPLIT_COLUMNS).to_pylist()
+    assert sorted(sum(splits.values(), []), key=lambda row: row['date']) == sorted(whole, key=lambda row: row['date'])
@@ -1,4 +1,5 @@
 import json
+import os
 
 from absl import app, flags, logging
 import torch
@@ -7,25 +8,26 @@ from pytorch_lightning.callbacks import ModelCheckpoint, EarlyStopping, Learning
 from pytorch_lightning.loggers import TensorBoardLogger
 
 from preprocess import KbAlbertCharTokenizer
-from models import KbAlbertClassificationModel
+from models import KbAlbertClassificationModel, KbAlbertMultiTaskModel
+from callbacks import FullStateCheckpoint
 
 
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string('train_path', default=None,
-                    help='Path to the train dataset')
+                    help='Path to the train dataset (.jsonl or .parquet corpus store)')
 flags.DEFINE_string('dev_path', default=None,
-                    help='Path to the dev dataset')
+                    help='Path to the dev dataset (.jsonl or .parquet corpus store)')
 flags.DEFINE_string('test_path', default=None,
-                    help='Path to the test dataset')
+                    help='Path to the test dataset (.jsonl or .parquet corpus store)')
 flags.DEFINE_string('label_type', default=None,
-                    help='Label type to train')
+                    help='Label type to train (major, minor or multi for both in one model)')
 flags.DEFINE_string('tokenizer_config_path', default=None,
                     help='Pretrained tokenizer config path')
 flags.DEFINE_string('vocab_path', default=None,
                     help='Pretrained tokenizer vocab path')
 flags.DEFINE_string('model_path', default=None,
-                    help='Pretrained model path')
+                    help='Pretrained model path (or a .safetensors bundle from export_bundle.py)')
 flags.DEFINE_string('model_config_path', default=None,
                     help='Pretrained model config path')
 flags.DEFINE_string('save_dir', default=None,
@@ -34,6 +36,10 @@ flags.DEFINE_string('version', default=None,
                     help='Explain experiment version')
 flags.DEFINE_integer('cuda_device', default=0,
                      help='If given, uses this CUDA device in training')
+flags.DEFINE_integer('num_processes', default=1,
+                     help='If given without CUDA devices, trains with this number of CPU processes (DDP over gloo)')
+flags.DEFINE_integer('num_threads', default=None,
+                     help='Intra-op threads per training process, defaults to the CPU cores divided by the processes')
 flags.DEFINE_integer('max_epochs', default=10,
                      help='If given, uses this max epochs in training')
 flags.DEFINE_integer('batch_size', default=4,
@@ -46,13 +52,29 @@ flags.DEFINE_float('weight_decay', default=0.1,
                    help='If given, uses this weight decay in training')
 flags.DEFINE_integer('warm_up', default=500,
                      help='If given, uses this warm up in training')
+flags.DEFINE_float('major_loss_weight', default=0.5,
+                   help='Weight of the major loss in the multi task loss, the minor loss gets the rest')
+flags.DEFINE_string('cache_dir', default=None,
+                    help='If given, caches the tokenized datasets in this directory')
+flags.DEFINE_integer('checkpoint_every', default=50,
+                     help='Saves a full state checkpoint every this number of steps')
+flags.DEFINE_bool('resume', default=False,
+                  help='Resumes from the last full state checkpoint of this version')
 
 
 def main(argv):
-    f = open(FLAGS.tokenizer_config_path, encoding='UTF-8')
-    tokenizer_config = json.loads(f.read())
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
     tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
                                       pretrained_init_configuration=tokenizer_config)
+
+    # seed before building the model so the classifier initialization is reproducible
+    seed_everything(42)
+
+    num_threads = FLAGS.num_threads
+    if num_threads is None and FLAGS.cuda_device == 0 and FLAGS.num_processes > 1:
+        num_threads = max(1, os.cpu_count() // FLAGS.num_processes)
+
     if FLAGS.label_type == 'major':
         model = KbAlbertClassificationModel(train_path=FLAGS.train_path,
                                             dev_path=FLAGS.dev_path,
@@ -65,7 +87,9 @@ def main(argv):
                                             num_workers=FLAGS.num_workers,
                                             lr=FLAGS.lr,
                                             weight_decay=FLAGS.weight_decay,
-                                            warm_up=FLAGS.warm_up)
+                                            warm_up=FLAGS.warm_up,
+                                            cache_dir=FLAGS.cache_dir,
+                                            num_threads=num_threads)
     elif FLAGS.label_type == 'minor':
         model = KbAlbertClassificationModel(train_path=FLAGS.train_path,
                                             dev_path=FLAGS.dev_path,
@@ -78,11 +102,26 @@ def main(argv):
                                             num_workers=FLAGS.num_workers,
                                             lr=FLAGS.lr,
                                             weight_decay=FLAGS.weight_decay,
-                                            warm_up=FLAGS.warm_up)
+                                            warm_up=FLAGS.warm_up,
+                                            cache_dir=FLAGS.cache_dir,
+                                            num_threads=num_threads)
+    elif FLAGS.label_type == 'multi':
+        model = KbAlbertMultiTaskModel(train_path=FLAGS.train_path,
+                                       dev_path=FLAGS.dev_path,
+                                       test_path=FLAGS.test_path,
+                                       model_path=FLAGS.model_path,
+                                       config_path=FLAGS.model_config_path,
+                                       tokenizer=tokenizer,
+                                       batch_size=FLAGS.batch_size,
+                                       num_workers=FLAGS.num_workers,
+                                       lr=FLAGS.lr,
+                                       weight_decay=FLAGS.weight_decay,
+                                       warm_up=FLAGS.warm_up,
+                                       cache_dir=FLAGS.cache_dir,
+                                       num_threads=num_threads,
+                                       major_loss_weight=FLAGS.major_loss_weight)
     else:
-        ValueError('Unknown model type')
-
-    seed_everything(42)
+        raise ValueError('Unknown model type')
 
     checkpoint_callback = ModelCheckpoint(
         filepath=FLAGS.save_dir + '/' + FLAGS.version,
@@ -106,17 +145,27 @@ def main(argv):
     )
     lr_logger = LearningRateLogger()
 
+    full_state_path = os.path.join(FLAGS.save_dir, FLAGS.version + '-full_state.ckpt')
+    resume_path = full_state_path if FLAGS.resume and os.path.exists(full_state_path) else None
+    if FLAGS.resume and resume_path is None:
+        logging.warning(f'No full state checkpoint at {full_state_path}, training from scratch')
+    full_state_checkpoint = FullStateCheckpoint(path=full_state_path,
+                                                every_n_steps=FLAGS.checkpoint_every,
+                                                resume_path=resume_path)
+
     if FLAGS.cuda_device > 1:
         trainer = Trainer(deterministic=True,
                           gpus=FLAGS.cuda_device,
                           distributed_backend='ddp',
+                          replace_sampler_ddp=False,
                           log_gpu_memory=True,
                           checkpoint_callback=checkpoint_callback,
                           check_val_every_n_epoch=1,
                           early_stop_callback=early_stop,
                           max_epochs=FLAGS.max_epochs,
                           logger=logger,
-                          callbacks=[lr_logger])
+                          resume_from_checkpoint=resume_path,
+                          callbacks=[lr_logger, full_state_checkpoint])
         logging.info(f'There are {torch.cuda.device_count()} GPU(s) available.')
         logging.info(f'Use the number of GPU: {FLAGS.cuda_device}')
     elif FLAGS.cuda_device == 1:
@@ -128,9 +177,24 @@ def main(argv):
                           early_stop_callback=early_stop,
                           max_epochs=FLAGS.max_epochs,
                           logger=logger,
-                          callbacks=[lr_logger])
+                          resume_from_checkpoint=resume_path,
+                          callbacks=[lr_logger, full_state_checkpoint])
         logging.info(f'There are {torch.cuda.device_count()} GPU(s) available.')
         logging.info(f'Use the number of GPU: {FLAGS.cuda_device}')
+    elif FLAGS.num_processes > 1:
+        trainer = Trainer(deterministic=True,
+                          num_processes=FLAGS.num_processes,
+                          distributed_backend='ddp_cpu',
+                          replace_sampler_ddp=False,
+                          checkpoint_callback=checkpoint_callback,
+                          check_val_every_n_epoch=1,
+                          early_stop_callback=early_stop,
+                          max_epochs=FLAGS.max_epochs,
+                          logger=logger,
+                          resume_from_checkpoint=resume_path,
+                          callbacks=[lr_logger, full_state_checkpoint])
+        logging.info(f'No GPU available, using {FLAGS.num_processes} CPU processes '
+                     f'with {num_threads} thread(s) each.')
     else:
         trainer = Trainer(deterministic=True,
                           checkpoint_callback=checkpoint_callback,
@@ -138,12 +202,24 @@ def main(argv):
                           early_stop_callback=early_stop,
                           max_epochs=FLAGS.max_epochs,
                           logger=logger,
-                          callbacks=[lr_logger])
+                          resume_from_checkpoint=resume_path,
+                          callbacks=[lr_logger, full_state_checkpoint])
         logging.info('No GPU available, using the CPU instead.')
     trainer.fit(model)
 
-    if FLAGS.label_type == 'major':
-        model.text_embedding.save_pretrained(FLAGS.save_dir)
+    if trainer.global_rank == 0:
+        # the saved weights are the checkpoint kept for the best val_loss, not the weights of the last epoch
+        best_model_path = trainer.checkpoint_callback.best_model_path
+        if best_model_path:
+            model.load_state_dict(torch.load(best_model_path, map_location='cpu')['state_dict'])
+        else:
+            logging.warning('No best checkpoint was saved, saving the weights of the last epoch')
+        if FLAGS.label_type in ['major', 'multi']:
+            model.text_embedding.save_pretrained(FLAGS.save_dir)
+        if FLAGS.label_type in ['major', 'minor']:
+            model.export_bundle(os.path.join(FLAGS.save_dir, FLAGS.version + '.safetensors'),
+                                tokenizer_config,
+                                FLAGS.vocab_path)
 
     if FLAGS.test_path:
         trainer.test()
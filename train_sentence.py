@@ -0,0 +1,125 @@
+"""
+Trains the sentence level model: decisions are split into sentences encoded once by a frozen text_embedding
+(cached by content in --sentence_cache_path) and only the attention pooling aggregator and classifier are trained.
+"""
+import json
+
+from absl import app, flags, logging
+from pytorch_lightning import Trainer, seed_everything
+from pytorch_lightning.callbacks import ModelCheckpoint, EarlyStopping
+from pytorch_lightning.loggers import TensorBoardLogger
+
+from preprocess import KbAlbertCharTokenizer
+from models import KbAlbertSentenceModel
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('train_path', default=None,
+                    help='Path to the train dataset (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('dev_path', default=None,
+                    help='Path to the dev dataset (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('test_path', default=None,
+                    help='Path to the test dataset (.jsonl or .parquet corpus store)')
+flags.DEFINE_string('label_type', default=None,
+                    help='Label type to train (major or minor)')
+flags.DEFINE_string('tokenizer_config_path', default=None,
+                    help='Pretrained tokenizer config path')
+flags.DEFINE_string('vocab_path', default=None,
+                    help='Pretrained tokenizer vocab path')
+flags.DEFINE_string('model_path', default=None,
+                    help='Pretrained (or trained by train.py) model path used as the frozen sentence encoder')
+flags.DEFINE_string('model_config_path', default=None,
+                    help='Pretrained model config path')
+flags.DEFINE_string('save_dir', default=None,
+                    help='Path to save model')
+flags.DEFINE_string('version', default=None,
+                    help='Explain experiment version')
+flags.DEFINE_string('sentence_cache_path', default=None,
+                    help='If given, keeps the sentence vectors in this file across runs')
+flags.DEFINE_integer('sentence_max_length', default=128,
+                     help='Length of the token ids of a sentence')
+flags.DEFINE_integer('max_sentences', default=64,
+                     help='Number of sentences of a decision used at most')
+flags.DEFINE_integer('cuda_device', default=0,
+                     help='If given, uses this CUDA device in training')
+flags.DEFINE_integer('max_epochs', default=50,
+                     help='If given, uses this max epochs in training')
+flags.DEFINE_integer('batch_size', default=16,
+                     help='If given, uses this batch size in training')
+flags.DEFINE_float('lr', default=1e-3,
+                   help='If given, uses this learning rate in training')
+flags.DEFINE_float('weight_decay', default=0.01,
+                   help='If given, uses this weight decay in training')
+
+
+def main(argv):
+    with open(FLAGS.tokenizer_config_path, encoding='UTF-8') as f:
+        tokenizer_config = json.loads(f.read())
+    tokenizer = KbAlbertCharTokenizer(vocab_file=FLAGS.vocab_path,
+                                      pretrained_init_configuration=tokenizer_config)
+
+    seed_everything(42)
+
+    if FLAGS.label_type == 'major':
+        num_classes = 3
+    elif FLAGS.label_type == 'minor':
+        num_classes = 4
+    else:
+        raise ValueError('Unknown model type')
+
+    model = KbAlbertSentenceModel(train_path=FLAGS.train_path,
+                                  dev_path=FLAGS.dev_path,
+                                  test_path=FLAGS.test_path,
+                                  model_path=FLAGS.model_path,
+                                  config_path=FLAGS.model_config_path,
+                                  tokenizer=tokenizer,
+                                  num_classes=num_classes,
+                                  batch_size=FLAGS.batch_size,
+                                  lr=FLAGS.lr,
+                                  weight_decay=FLAGS.weight_decay,
+                                  sentence_max_length=FLAGS.sentence_max_length,
+                                  max_sentences=FLAGS.max_sentences,
+                                  sentence_cache_path=FLAGS.sentence_cache_path)
+    logging.info(f'Encoded {model.sentence_encoder.num_encoded} sentences, '
+                 f'reused {model.sentence_encoder.num_reused} from the cache')
+
+    checkpoint_callback = ModelCheckpoint(
+        filepath=FLAGS.save_dir + '/' + FLAGS.version,
+        save_top_k=1,
+        monitor='val_loss',
+        mode='min'
+    )
+
+    early_stop = EarlyStopping(
+        monitor='val_loss',
+        patience=5,
+        strict=False,
+        verbose=False,
+        mode='min'
+    )
+
+    logger = TensorBoardLogger(
+        save_dir=FLAGS.save_dir,
+        name='logs_sentence_' + FLAGS.label_type,
+        version=FLAGS.version
+    )
+
+    trainer = Trainer(deterministic=True,
+                      gpus=FLAGS.cuda_device,
+                      checkpoint_callback=checkpoint_callback,
+                      check_val_every_n_epoch=1,
+                      early_stop_callback=early_stop,
+                      max_epochs=FLAGS.max_epochs,
+                      logger=logger)
+    trainer.fit(model)
+
+    if FLAGS.test_path:
+        trainer.test()
+
+
+if __name__ == '__main__':
+    flags.mark_flags_as_required([
+        'train_path', 'dev_path', 'label_type', 'vocab_path', 'model_path', 'model_config_path', 'save_dir', 'version'
+    ])
+    app.run(main)